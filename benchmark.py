@@ -0,0 +1,715 @@
+"""Bilibili-Manga-Metadata-Crawler 性能测试"""
+
+import os
+import sys
+import json
+import random
+import statistics
+import time
+import argparse
+import tempfile
+import threading
+import py_compile
+import subprocess
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import psutil
+import requests
+from colorama import Fore
+from openpyxl import Workbook
+
+import main
+
+class MockHandler(BaseHTTPRequestHandler):
+    """模拟接口请求处理"""
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode()).items()}
+        self.handle_endpoint(urlparse(self.path).path.rsplit("/", 1)[-1], payload)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if not path.endswith("index.pageContext.json"):
+            self.send_error(404)
+            return
+        self.handle_endpoint("ranking", {"rank_type": path.split("/")[-2]})
+
+    def handle_endpoint(self, endpoint: str, payload: dict):
+        """模拟延迟与412限频后返回对应接口的数据"""
+        self.server.connections.add(self.client_address)
+        with self.server.lock:
+            self.server.requests += 1
+            self.server.in_flight += 1
+            throttled = (self.server.max_in_flight and self.server.in_flight > self.server.max_in_flight) \
+                or random.random() < self.server.error_rate
+            if (endpoint, payload.get("page_num")) in self.server.throttle_once:
+                self.server.throttle_once.discard((endpoint, payload.get("page_num")))
+                throttled = True
+            if throttled:
+                self.server.throttled += 1
+        try:
+            if self.server.latency:
+                time.sleep(self.server.latency / 1000)
+            if throttled:
+                self.send_error(412)
+                return
+            if endpoint == "ComicDetail":
+                body = self.comic_detail(payload)
+            elif endpoint == "ClassPage":
+                body = self.class_page(payload)
+            elif endpoint == "GetComicAlbumPlus":
+                body = self.comic_album(payload)
+            elif endpoint == "GetDailyPush":
+                body = self.daily_push(payload)
+            elif endpoint == "HomeFeed":
+                body = self.home_feed(payload)
+            elif endpoint == "AllLabel":
+                body = self.all_label()
+            elif endpoint == "ranking":
+                body = self.ranking(payload["rank_type"])
+            else:
+                self.send_error(404)
+                return
+        finally:
+            with self.server.lock:
+                self.server.in_flight -= 1
+        self.send_json(body)
+
+    def send_json(self, body):
+        """返回twirp格式的json"""
+        data = json.dumps({"code": 0, "msg": "", "data": body}, ensure_ascii=False).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def all_label(self) -> dict:
+        """模拟全部分类"""
+        return {
+            "styles": [{"id": 1, "name": "热血"}, {"id": 2, "name": "恋爱"}],
+            "areas": [{"id": 1, "name": "大陆"}, {"id": 2, "name": "日本"}],
+            "status": [{"id": 0, "name": "连载"}, {"id": 1, "name": "完结"}],
+        }
+
+    def ranking(self, rank_type: str) -> dict:
+        """模拟排行页"""
+        return {
+            "rankInfo": {"list": [{"id": 0, "name": "人气榜"}, {"id": 1, "name": "畅销榜"}]},
+            "rankListInfo": [{
+                "comic_id": comic_id,
+                "title": f"漫画{comic_id}",
+                "total": self.total(comic_id),
+                "last_short_title": str(self.total(comic_id)),
+                "is_finish": 0,
+            } for comic_id in range(1, min(self.server.catalog, 100) + 1)],
+        }
+
+    def total(self, comic_id: int) -> int:
+        """模拟漫画章节数, 被标记更新的漫画多一话"""
+        return self.server.episodes + (1 if comic_id in self.server.updated else 0)
+
+    def class_page(self, payload: dict) -> list:
+        """模拟分类页"""
+        page_num, page_size = int(payload.get("page_num", 1)), int(payload.get("page_size", 20))
+        start = (page_num - 1) * page_size + 1
+        return [{
+            "season_id": comic_id,
+            "title": f"漫画{comic_id}",
+            "is_finish": 0,
+            "is_free": 1,
+            "total": self.total(comic_id),
+            "last_short_title": str(self.total(comic_id)),
+            "introduction": "简" * self.server.padding,
+        } for comic_id in range(start, min(start + page_size, self.server.catalog + 1))]
+
+    def home_feed(self, payload: dict) -> dict:
+        """模拟主页信息流"""
+        page_num, page_size = int(payload.get("page_num", 1)), int(payload.get("page_size", 20))
+        start = (page_num - 1) * page_size + 1
+        return {"feeds": [{
+            "item_id": comic_id,
+            "title": f"漫画{comic_id}",
+            "type": 1,
+            "image": "",
+            "comic_info": {"is_finish": 0, "styles": ["热血"]},
+        } for comic_id in range(start, min(start + page_size, self.server.catalog + 1))]}
+
+    def daily_push(self, payload: dict) -> dict:
+        """模拟更新推荐页, 每天推荐daily本漫画"""
+        page_num, page_size = int(payload.get("page_num", 1)), int(payload.get("page_size", 100))
+        day = int(payload.get("date", "2024-01-01").replace("-", "")) % 97
+        start = (page_num - 1) * page_size
+        return {"list": [{
+            "comic_id": (day * self.server.daily + index) % self.server.catalog + 1,
+            "title": f"漫画{(day * self.server.daily + index) % self.server.catalog + 1}",
+            "ep_id": index,
+            "ep_title": f"第{index}话",
+            "short_title": str(index),
+            "comment_total": index,
+            "allow_wait_free": False,
+            "styles": ["热血"],
+            "url": "",
+            "vertical_cover": "",
+        } for index in range(start, min(start + page_size, self.server.daily))]}
+
+    def comic_album(self, payload: dict) -> dict:
+        """模拟漫画特典"""
+        return {"list": fake_bonus(int(payload.get("comic_id", 0)), self.server.bonus)}
+
+    def comic_detail(self, payload: dict) -> dict:
+        """模拟漫画详情"""
+        comic_id = int(payload.get("comic_id", 0))
+        ep_list = [{
+            "id": comic_id * 10000 + ord,
+            "ord": ord,
+            "short_title": str(ord),
+            "title": f"第{ord}话",
+            "pub_time": f"2024-01-{ord % 28 + 1:02d} 12:00:00",
+            "index_last_modified": f"2024-02-{ord % 28 + 1:02d} 12:00:00",
+            "pay_mode": int(ord > 3),
+            "pay_gold": 0 if ord <= 3 else 50,
+            "is_locked": ord > 3,
+            "is_in_free": ord <= 3,
+            "size": ord * 1024,
+            "image_count": 20,
+        } for ord in range(self.total(comic_id), 0, -1)]
+        return {
+            "id": comic_id,
+            "title": f"漫画{comic_id}",
+            "is_finish": 0,
+            "pay_mode": 1,
+            "total": self.total(comic_id),
+            "release_time": "",
+            "introduction": "简" * self.server.padding,
+            "ep_list": ep_list,
+        }
+
+class MockServer(ThreadingHTTPServer):
+    """本地模拟哔哩哔哩漫画接口"""
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, latency=0, episodes=50, max_in_flight=0, catalog=1000, bonus=5, daily=30,
+                 padding=0, error_rate=0.0, throttle_once=()):
+        super().__init__(("127.0.0.1", 0), MockHandler)
+        self.latency = latency
+        self.episodes = episodes
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.requests = 0
+        self.catalog = catalog
+        self.bonus = bonus
+        self.daily = daily
+        self.padding = padding
+        self.error_rate = error_rate
+        # (接口名, 页码)首次请求时返回412, 之后正常返回
+        self.throttle_once = set(throttle_once)
+        self.throttled = 0
+        self.updated = set()
+        self.lock = threading.Lock()
+        self.connections = set()
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+def bench_pool(opts: argparse.Namespace):
+    """对比连接池与逐次新建连接"""
+    ids = [str(i) for i in range(1, opts.count + 1)]
+    for name, pool_size in (("逐次新建连接", "0"), ("连接池复用", str(opts.workers))):
+        with MockServer(latency=opts.latency, episodes=opts.episodes) as server:
+            args = main.parse_args(["-i", ",".join(ids), "-y", "-w", str(opts.workers), "--pool_size", pool_size])
+            cl = main.Crawler(args)
+            cl.base_url = server.base_url
+            start = time.perf_counter()
+            comics = cl.get_comics_details(ids)
+            elapsed = time.perf_counter() - start
+            cl.close()
+            cl.journal.remove()
+            print(f"{Fore.CYAN}[{name}]{Fore.RESET} {len(comics)}个请求, 耗时{elapsed:.2f}秒, "
+                  f"{len(comics) / elapsed:.1f}个/秒, 服务端连接{len(server.connections)}个")
+
+def bench_engine(opts: argparse.Namespace):
+    """对比多线程与异步协程引擎"""
+    ids = [str(i) for i in range(1, opts.count + 1)]
+    for engine in ("thread", "async"):
+        with MockServer(latency=opts.latency, episodes=opts.episodes) as server:
+            args = main.parse_args(["-i", ",".join(ids), "-y", "-w", str(opts.workers), "--engine", engine])
+            cl = main.Crawler(args)
+            cl.base_url = server.base_url
+            start = time.perf_counter()
+            comics = cl.get_comics_details(ids)
+            elapsed = time.perf_counter() - start
+            cl.close()
+            cl.journal.remove()
+            print(f"{Fore.CYAN}[{engine}]{Fore.RESET} {len(comics)}个请求, 并发{opts.workers}, 耗时{elapsed:.2f}秒, "
+                  f"{len(comics) / elapsed:.1f}个/秒")
+
+def bench_adaptive(opts: argparse.Namespace):
+    """模拟服务端并发阈值, 测试自适应并发"""
+    ids = [str(i) for i in range(1, opts.count + 1)]
+    with MockServer(latency=opts.latency, episodes=opts.episodes, max_in_flight=opts.threshold) as server:
+        args = main.parse_args(["-i", ",".join(ids), "-y", "-w", str(opts.workers), "--adaptive",
+                                "--cooldown", str(opts.cooldown), "--engine", opts.engine])
+        cl = main.Crawler(args)
+        cl.base_url = server.base_url
+        start = time.perf_counter()
+        comics = cl.get_comics_details(ids)
+        elapsed = time.perf_counter() - start
+        cl.close()
+        cl.journal.remove()
+        print(f"{Fore.CYAN}[adaptive]{Fore.RESET} 完成{len(comics)}/{len(ids)}个请求, 服务端阈值{opts.threshold}并发, "
+              f"耗时{elapsed:.2f}秒, {len(comics) / elapsed:.1f}个/秒")
+
+def bench_paging(opts: argparse.Namespace):
+    """分页中途一页触发412时, 自适应并发应在冷却后重试该页并继续请求后续分页, 结果不完整时返回非零退出码"""
+    with MockServer(latency=opts.latency, catalog=opts.count, throttle_once=[("ClassPage", str(opts.page))]) as server:
+        args = main.parse_args(["-t", "classify", "-S", "50", "-y", "-w", str(opts.workers), "--adaptive",
+                                "--cooldown", str(opts.cooldown)])
+        cl = main.Crawler(args)
+        cl.base_url = server.base_url
+        start = time.perf_counter()
+        comics = cl.get_classify_page_all()
+        elapsed = time.perf_counter() - start
+        cl.close()
+        print(f"{Fore.CYAN}[paging]{Fore.RESET} 第{opts.page}页触发412一次, 获取{len(comics)}/{opts.count}本漫画, "
+              f"412 {server.throttled}次, 耗时{elapsed:.2f}秒")
+    if len(comics) != opts.count:
+        print(f"{Fore.RED}分页结果不完整{Fore.RESET}")
+        sys.exit(1)
+
+class BufferedXlsxWriter(main.XlsxWriter):
+    """旧版写入方式: 整个工作簿保存在内存中, 用于对比"""
+    def open(self):
+        self._workbook = Workbook()
+        self._sheet = self._workbook.active
+        self._sheet.append(list(self.document.field_map.values()))
+        self._sheet.auto_filter.ref = self.document.field_ref
+
+def fake_bonus(comic_id: int, count: int) -> list:
+    """模拟一本漫画的特典列表, 下架时间分布在前100天到后300天之间的不同时刻"""
+    return [{
+        "item": {
+            "id": comic_id * 100 + index,
+            "title": f"特典{index}",
+            "online_time": f"2024-{index % 12 + 1:02d}-01 00:00:00",
+            "offline_time": (datetime.now() + timedelta(days=(comic_id * 7 + index * 13) % 400 - 100)).strftime(f"%Y-%m-%d {(comic_id + index) % 24:02d}:00:00"),
+        },
+    } for index in range(count)]
+
+def fake_comic(comic_id: int, intro_length: int) -> dict:
+    """生成一条模拟漫画详情"""
+    return {
+        "comic_id": comic_id,
+        "title": f"漫画{comic_id}",
+        "authors": [{"name": f"作者{comic_id % 97}"}],
+        "is_finish": comic_id % 2,
+        "total": comic_id % 300,
+        "last_ep_title": f"第{comic_id % 300}话",
+        "last_ep_date": "2024-01-01 12:00:00",
+        "introduction": "简介" * (intro_length // 2),
+        "styles": ["热血", "冒险"],
+        "tags": [{"name": "热血"}, {"name": "冒险"}],
+        "horizontal_covers": [f"https://i0.hdslb.com/bfs/manga-static/{comic_id}.jpg"],
+        "vertical_cover": f"https://i0.hdslb.com/bfs/manga-static/{comic_id}v.jpg",
+        "release_time": "2020-01-01",
+    }
+
+def sample_rss(func, *args):
+    """在子进程中执行, 返回结果、耗时(秒)与常驻内存增量峰值(MB)"""
+    process = psutil.Process()
+    base = peak = process.memory_info().rss
+    finished = threading.Event()
+
+    def sample():
+        nonlocal peak
+        while not finished.wait(0.05):
+            peak = max(peak, process.memory_info().rss)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    finished.set()
+    sampler.join()
+    peak = max(peak, process.memory_info().rss)
+    return result, elapsed, (peak - base) / 1024 / 1024
+
+def measure(func, *args):
+    """每项测试使用独立子进程, 避免前一项测试的内存占用影响结果"""
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        return executor.submit(sample_rss, func, *args).result()
+
+def output_document(path: str) -> main.Document:
+    """以path为输出文件的Document"""
+    return main.Document(main.parse_args(["-i", "1", "-y", "-O", path]))
+
+def xlsx_export(writer_class, path: str, rows: int, intro: int) -> int:
+    """导出模拟数据"""
+    with writer_class(output_document(path), path) as writer:
+        for comic_id in range(1, rows + 1):
+            writer.write(fake_comic(comic_id, intro))
+    return writer.count
+
+def xlsx_import(path: str) -> int:
+    """导入数据"""
+    return len(output_document(path).load(path))
+
+def bench_xlsx(opts: argparse.Namespace):
+    """测试xlsx导出与导入的耗时和内存"""
+    writers = [("只写模式", main.XlsxWriter)]
+    if opts.buffered:
+        writers.append(("内存工作簿", BufferedXlsxWriter))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "metadata.xlsx")
+        columns = len(output_document(path).field_map)
+        for rows in opts.rows:
+            for name, writer_class in writers:
+                _, elapsed, peak = measure(xlsx_export, writer_class, path, rows, opts.intro)
+                size = os.path.getsize(path) / 1024 / 1024
+                print(f"{Fore.CYAN}[{name}]{Fore.RESET} 导出{rows}行x{columns}列, 耗时{elapsed:.2f}秒, "
+                      f"内存增量峰值{peak:.1f}MB, 文件{size:.1f}MB")
+            count, elapsed, peak = measure(xlsx_import, path)
+            print(f"{Fore.CYAN}[只读模式]{Fore.RESET} 导入{count}行, 耗时{elapsed:.2f}秒, 内存增量峰值{peak:.1f}MB")
+
+def legacy_comic_details(content: bytes) -> dict:
+    """旧版解析方式: 完整解码后按修改时间排序全部章节"""
+    comic = json.loads(content).get("data", {})
+    ep_list = comic.get("ep_list")
+    ep_list.sort(key=lambda x: datetime.fromisoformat(x["index_last_modified"]))
+    return {"last_ep_id": ep_list[0]["id"], "last_modify_ep_id": ep_list[-1]["id"]}
+
+def bench_decode(opts: argparse.Namespace):
+    """测试漫画详情响应的解码耗时"""
+    if opts.payload:
+        with open(opts.payload, "rb") as f:
+            payloads = [f.read()]
+    else:
+        with MockServer(episodes=opts.episodes) as server:
+            url = f"{server.base_url}/twirp/comic.v1.Comic/ComicDetail"
+            payloads = [requests.post(url, data={"comic_id": i}).content for i in range(1, 11)]
+    size = sum(len(content) for content in payloads) / len(payloads) / 1024
+    cl = main.Crawler(main.parse_args(["-i", "1", "-y", "-O", "metadata.csv"]))
+    response = requests.Response()
+    response.status_code = 200
+
+    def handle(content, decoder, project):
+        cl.decoder, cl.keep_extras = decoder, not project
+        response._content = content
+        return cl.handle_comic_details(response)
+
+    cases = [("旧版json+排序", legacy_comic_details)]
+    for backend in ("json", "orjson", "msgspec"):
+        decoder = main.ResponseDecoder(backend)
+        try:
+            decoder.loads(payloads[0])
+        except RuntimeError as e:
+            print(e)
+            continue
+        cases.append((f"{backend}+单次遍历", lambda content, decoder=decoder: handle(content, decoder, False)))
+        if backend == "msgspec":
+            cases.append(("msgspec投影+单次遍历", lambda content, decoder=decoder: handle(content, decoder, True)))
+    cl.close()
+    for name, decode in cases:
+        start = time.process_time()
+        for _ in range(opts.repeat):
+            for content in payloads:
+                decode(content)
+        cost = (time.process_time() - start) / opts.repeat / len(payloads) * 1000
+        print(f"{Fore.CYAN}[{name}]{Fore.RESET} 响应{size:.0f}KB, 每次解析CPU耗时{cost:.3f}毫秒")
+
+def legacy_summarize_bonus(bonus: list) -> dict:
+    """旧版特典汇总: 四次max/min遍历, 逐条strptime"""
+    summary = {"bonus_total": len(bonus)}
+    if len(bonus) == 0:
+        return summary
+    summary["last_bonus_title"] = max(bonus, key=lambda x: x["item"]["online_time"])["item"]["title"]
+    summary["last_bonus_date"] = max(bonus, key=lambda x: x["item"]["online_time"])["item"]["online_time"].split(" ")[0]
+    future_bonus = [item for item in bonus if datetime.strptime(item["item"]["offline_time"].split(" ")[0], '%Y-%m-%d') > datetime.today()]
+    if len(future_bonus) == 0:
+        return summary
+    summary["recently_lock_bonus_title"] = min(future_bonus, key=lambda x: x["item"]["offline_time"])["item"]["title"]
+    summary["recently_lock_bonus_date"] = min(future_bonus, key=lambda x: x["item"]["offline_time"])["item"]["offline_time"].split(" ")[0]
+    return summary
+
+def bench_bonus(opts: argparse.Namespace):
+    """测试特典汇总与即将下架特典查询的耗时"""
+    comics = [fake_bonus(comic_id, opts.bonus) for comic_id in range(opts.count)]
+    cl = main.Crawler(main.parse_args(["-i", "1", "-y", "-O", "metadata.csv"]))
+    cl.close()
+    start = time.process_time()
+    legacy = [legacy_summarize_bonus(items) for items in comics]
+    legacy_cost = time.process_time() - start
+    start = time.process_time()
+    summaries = [cl.summarize_bonus(comic_id, items) for comic_id, items in enumerate(comics)]
+    cost = time.process_time() - start
+    assert legacy == summaries, "汇总结果不一致"
+    print(f"{Fore.CYAN}[特典汇总]{Fore.RESET} {opts.count}本漫画x{opts.bonus}个特典, "
+          f"旧版{legacy_cost * 1000:.1f}毫秒, 单次遍历{cost * 1000:.1f}毫秒")
+    start = time.process_time()
+    deadline = (datetime.now() + timedelta(days=opts.days)).strftime("%Y-%m-%d %H:%M:%S")
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    scanned = sorted(entry["item"]["offline_time"] for items in comics for entry in items
+                     if now < entry["item"]["offline_time"] <= deadline)
+    scan_cost = time.process_time() - start
+    start = time.process_time()
+    expiring = cl.bonus_index.expiring(opts.days)
+    cost = time.process_time() - start
+    print(f"{Fore.CYAN}[即将下架]{Fore.RESET} 未来{opts.days}天内{len(expiring)}个特典, "
+          f"全量扫描{scan_cost * 1000:.2f}毫秒, 索引查询{cost * 1000:.2f}毫秒, "
+          f"结果{"一致" if scanned == [item["offline_time"] for item in expiring] else "不一致"}")
+
+def import_times(code: str) -> dict:
+    """在新进程中用 -X importtime 执行代码, 返回各模块的累计导入耗时(单位: 微秒)与层级"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(main.__file__)), check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(cumulative), (len(name) - len(name.lstrip()) - 1) // 2)
+    return times
+
+def bench_startup(opts: argparse.Namespace):
+    """测试CLI启动耗时: main的导入耗时与 --id 参数解析的进程总耗时, 超出预算时返回非零退出码"""
+    py_compile.compile(main.__file__)
+    imports, walls = [], []
+    for _ in range(opts.repeat):
+        imports.append(import_times("import main")["main"][0] / 1000)
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import main; main.Document(main.parse_args(['-i', '1', '-y']))"],
+                       cwd=os.path.dirname(os.path.abspath(main.__file__)), check=True)
+        walls.append((time.perf_counter() - start) * 1000)
+    times = import_times("import main")
+    direct = sorted(((cost, name) for name, (cost, level) in times.items() if level == 1), reverse=True)
+    print(f"{Fore.CYAN}[导入耗时]{Fore.RESET} main 中位数{statistics.median(imports):.1f}毫秒, "
+          f"进程总耗时中位数{statistics.median(walls):.1f}毫秒")
+    print("  " + ", ".join(f"{name} {cost / 1000:.1f}毫秒" for cost, name in direct[:opts.top]))
+    heavy = [name for name in ("asyncio", "openpyxl", "psutil", "tkinter", "pstats", "tracemalloc", "pyarrow", "msgspec", "orjson")
+             if name in times]
+    if heavy:
+        print(f"{Fore.YELLOW}  CLI路径不应导入: {", ".join(heavy)}{Fore.RESET}")
+    if statistics.median(imports) > opts.budget or heavy:
+        print(f"{Fore.RED}超出启动预算{opts.budget:g}毫秒{Fore.RESET}")
+        sys.exit(1)
+    print(f"{Fore.GREEN}启动耗时在预算{opts.budget:g}毫秒以内{Fore.RESET}")
+
+def read_columnar(path: str) -> int:
+    """用pyarrow读回整个文件"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    if path.endswith(".parquet"):
+        return pq.read_table(path).num_rows
+    return pa.ipc.open_file(pa.memory_map(path)).read_all().num_rows
+
+def bench_columnar(opts: argparse.Namespace):
+    """测试列式格式与csv的导出与读回耗时"""
+    with tempfile.TemporaryDirectory() as tmp:
+        for ext in ("parquet", "arrow", "csv"):
+            path = os.path.join(tmp, f"metadata.{ext}")
+            dm = output_document(path)
+            start = time.perf_counter()
+            try:
+                with dm.writer() as writer:
+                    for comic_id in range(1, opts.rows + 1):
+                        writer.write(fake_comic(comic_id, opts.intro))
+            except RuntimeError as e:
+                print(e)
+                continue
+            elapsed = time.perf_counter() - start
+            size = os.path.getsize(path) / 1024 / 1024
+            start = time.perf_counter()
+            count = len(dm.load(path)) if ext == "csv" else read_columnar(path)
+            read = time.perf_counter() - start
+            print(f"{Fore.CYAN}[{ext}]{Fore.RESET} 导出{opts.rows}行, 耗时{elapsed:.2f}秒, 文件{size:.1f}MB, "
+                  f"读回{count}行耗时{read * 1000:.1f}毫秒")
+
+class TimedCrawler(main.Crawler):
+    """记录每次请求耗时的Crawler"""
+    def __init__(self, args: argparse.Namespace):
+        super().__init__(args)
+        self.latencies = []
+
+    def request(self, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().request(method, url, **kwargs)
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+    async def async_request(self, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await super().async_request(method, url, **kwargs)
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+def crawl_case(base_url: str, argv: list) -> list:
+    """完整执行一次分类页+详情+特典爬取, 返回每次请求的耗时"""
+    args = main.parse_args(argv)
+    cl = TimedCrawler(args)
+    cl.base_url = base_url
+    try:
+        main.run_cli(args, cl, main.Document(args))
+    finally:
+        cl.close()
+        cl.journal.remove()
+    return cl.latencies
+
+def export_case(base_url: str, argv: list, formats: list) -> list:
+    """爬取一次后导出为各个格式, 返回各格式的导出耗时与文件大小"""
+    cl = main.Crawler(main.parse_args(argv + ["-O", "metadata.json"]))
+    cl.base_url = base_url
+    try:
+        comics = cl.get_comics_details([comic["comic_id"] for comic in cl.get_classify_page_all()])
+        cl.get_comic_bonus_all(comics)
+    finally:
+        cl.close()
+        cl.journal.remove()
+    result = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for ext in formats:
+            path = os.path.join(tmp, f"metadata.{ext}")
+            dm = main.Document(main.parse_args(argv + ["-O", path]))
+            start = time.perf_counter()
+            try:
+                dm.save(comics)
+            except RuntimeError as e:
+                result.append((ext, None, str(e)))
+                continue
+            result.append((ext, time.perf_counter() - start, os.path.getsize(path) / 1024 / 1024))
+    return result
+
+def bench_suite(opts: argparse.Namespace):
+    """端到端性能测试: 顺序与并发TaskRunner的吞吐、延迟、内存, 以及各输出格式的导出耗时"""
+    modes = [("顺序", ["-w", "1"]), ("多线程", ["-w", str(opts.workers)])]
+    if opts.engine_async:
+        modes.append(("异步", ["-w", str(opts.workers), "--engine", "async"]))
+    extra = ["--adaptive", "--cooldown", str(opts.cooldown)] if opts.adaptive else []
+    with MockServer(latency=opts.latency, episodes=opts.episodes, catalog=opts.count, bonus=opts.bonus,
+                    padding=opts.padding, error_rate=opts.error_rate) as server, tempfile.TemporaryDirectory() as tmp:
+        for name, flags in modes:
+            argv = ["-t", "classify", "-S", "50", "-d", "-b", "-y"] + flags + extra + ["-O", os.path.join(tmp, "metadata.json")]
+            requests_before, throttled_before = server.requests, server.throttled
+            latencies, elapsed, peak = measure(crawl_case, server.base_url, argv)
+            count = server.requests - requests_before
+            percentiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+            print(f"{Fore.CYAN}[{name}]{Fore.RESET} {count}次请求, 耗时{elapsed:.2f}秒, {count / elapsed:.1f}次/秒, "
+                  f"p50 {percentiles[49] * 1000:.1f}毫秒, p99 {percentiles[98] * 1000:.1f}毫秒, "
+                  f"内存增量峰值{peak:.1f}MB, 412 {server.throttled - throttled_before}次")
+        argv = ["-t", "classify", "-S", "50", "-d", "-b", "-y", "-w", str(opts.workers)]
+        server.error_rate = 0
+        exports, _, _ = measure(export_case, server.base_url, argv, opts.formats)
+        for ext, elapsed, size in exports:
+            if elapsed is None:
+                print(f"{Fore.CYAN}[导出{ext}]{Fore.RESET} {size}")
+            else:
+                print(f"{Fore.CYAN}[导出{ext}]{Fore.RESET} {opts.count}本漫画, 耗时{elapsed * 1000:.1f}毫秒, 文件{size:.2f}MB")
+
+def parse_args():
+    """参数"""
+    parser = argparse.ArgumentParser(description="bmmc 性能测试")
+    sub = parser.add_subparsers(dest="bench", required=True)
+    pool = sub.add_parser("pool", help="连接池对比测试")
+    pool.add_argument("-n", "--count", help="请求数量", type=int, default=1000)
+    pool.add_argument("-w", "--workers", help="并发线程数量", type=int, default=16)
+    pool.add_argument("-l", "--latency", help="模拟接口延迟(单位: 毫秒)", type=int, default=0)
+    pool.add_argument("-e", "--episodes", help="模拟每本漫画章节数", type=int, default=50)
+    engine = sub.add_parser("engine", help="并发引擎对比测试")
+    engine.add_argument("-n", "--count", help="请求数量", type=int, default=2000)
+    engine.add_argument("-w", "--workers", help="并发数量", type=int, default=200)
+    engine.add_argument("-l", "--latency", help="模拟接口延迟(单位: 毫秒)", type=int, default=200)
+    engine.add_argument("-e", "--episodes", help="模拟每本漫画章节数", type=int, default=50)
+    adaptive = sub.add_parser("adaptive", help="自适应并发测试")
+    adaptive.add_argument("-n", "--count", help="请求数量", type=int, default=3000)
+    adaptive.add_argument("-w", "--workers", help="并发上限", type=int, default=64)
+    adaptive.add_argument("-l", "--latency", help="模拟接口延迟(单位: 毫秒)", type=int, default=50)
+    adaptive.add_argument("-e", "--episodes", help="模拟每本漫画章节数", type=int, default=50)
+    adaptive.add_argument("-t", "--threshold", help="服务端超过此并发返回412", type=int, default=12)
+    adaptive.add_argument("-c", "--cooldown", help="触发412后的冷却时间(单位: 秒)", type=float, default=1)
+    adaptive.add_argument("--engine", choices=["thread", "async"], default="thread")
+    paging = sub.add_parser("paging", help="分页中途触发412的自适应重试测试")
+    paging.add_argument("-n", "--count", help="模拟漫画数量", type=int, default=1000)
+    paging.add_argument("-p", "--page", help="触发412的页码", type=int, default=3)
+    paging.add_argument("-w", "--workers", help="并发上限", type=int, default=4)
+    paging.add_argument("-l", "--latency", help="模拟接口延迟(单位: 毫秒)", type=int, default=5)
+    paging.add_argument("-c", "--cooldown", help="触发412后的冷却时间(单位: 秒)", type=float, default=0.3)
+    xlsx = sub.add_parser("xlsx", help="xlsx导出导入测试")
+    xlsx.add_argument("-r", "--rows", help="测试行数", type=lambda v: [int(i) for i in v.split(",")],
+                      default=[10000, 50000, 200000])
+    xlsx.add_argument("--intro", help="模拟简介长度", type=int, default=500)
+    xlsx.add_argument("--buffered", help="同时测试旧版内存工作簿写入", action="store_true")
+    suite = sub.add_parser("suite", help="端到端性能测试")
+    suite.add_argument("-n", "--count", help="模拟漫画数量", type=int, default=500)
+    suite.add_argument("-w", "--workers", help="并发数量", type=int, default=16)
+    suite.add_argument("-l", "--latency", help="模拟接口延迟(单位: 毫秒)", type=int, default=20)
+    suite.add_argument("-e", "--episodes", help="模拟每本漫画章节数", type=int, default=50)
+    suite.add_argument("-b", "--bonus", help="模拟每本漫画特典数", type=int, default=5)
+    suite.add_argument("--padding", help="每本漫画简介的填充字数, 用于调节响应大小", type=int, default=0)
+    suite.add_argument("--error_rate", help="随机返回412的概率", type=float, default=0)
+    suite.add_argument("--adaptive", help="使用自适应并发", action="store_true")
+    suite.add_argument("--cooldown", help="触发412后的冷却时间(单位: 秒)", type=float, default=1)
+    suite.add_argument("--async", dest="engine_async", help="同时测试异步引擎", action="store_true")
+    suite.add_argument("--formats", help="测试的导出格式", type=lambda v: v.split(","),
+                       default=["json", "jsonl", "csv", "xlsx", "sqlite", "parquet", "arrow"])
+    columnar = sub.add_parser("columnar", help="列式格式导出读回测试")
+    columnar.add_argument("-r", "--rows", help="测试行数", type=int, default=100000)
+    columnar.add_argument("--intro", help="模拟简介长度", type=int, default=200)
+    decode = sub.add_parser("decode", help="漫画详情解码测试")
+    decode.add_argument("-e", "--episodes", help="模拟每本漫画章节数", type=int, default=2000)
+    decode.add_argument("-r", "--repeat", help="重复次数", type=int, default=20)
+    decode.add_argument("-p", "--payload", help="使用录制的ComicDetail响应文件")
+    bonus = sub.add_parser("bonus", help="特典汇总与下架索引测试")
+    bonus.add_argument("-n", "--count", help="模拟漫画数量", type=int, default=5000)
+    bonus.add_argument("-b", "--bonus", help="模拟每本漫画特典数", type=int, default=30)
+    bonus.add_argument("-d", "--days", help="查询未来多少天内下架", type=int, default=7)
+    startup = sub.add_parser("startup", help="CLI启动耗时测试")
+    startup.add_argument("-r", "--repeat", help="重复次数", type=int, default=10)
+    startup.add_argument("--budget", help="main导入耗时预算(单位: 毫秒)", type=float, default=200)
+    startup.add_argument("--top", help="展示耗时最多的直接导入模块数", type=int, default=8)
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    opts = parse_args()
+    if opts.bench == "pool":
+        bench_pool(opts)
+    elif opts.bench == "engine":
+        bench_engine(opts)
+    elif opts.bench == "adaptive":
+        bench_adaptive(opts)
+    elif opts.bench == "paging":
+        bench_paging(opts)
+    elif opts.bench == "xlsx":
+        bench_xlsx(opts)
+    elif opts.bench == "suite":
+        bench_suite(opts)
+    elif opts.bench == "columnar":
+        bench_columnar(opts)
+    elif opts.bench == "decode":
+        bench_decode(opts)
+    elif opts.bench == "bonus":
+        bench_bonus(opts)
+    elif opts.bench == "startup":
+        bench_startup(opts)
+    sys.exit(0)
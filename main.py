@@ -5,24 +5,31 @@ import csv
 import sys
 import json
 import uuid
+import socket
 import time
+import heapq
 import random
+import zlib
 import hashlib
+import sqlite3
 import argparse
+import threading
 import traceback
-import tkinter as tk
-from threading import Lock
-from datetime import datetime, timedelta
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from threading import Event, Lock, Thread
+from contextlib import closing, contextmanager, nullcontext
+from itertools import count, repeat
+from collections import deque
+from collections.abc import MutableMapping
+from datetime import date, datetime, timedelta
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
 
-import psutil
 import urllib3
 import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
 from tqdm import tqdm
 from colorama import Fore
-from openpyxl import Workbook, load_workbook
-from openpyxl.styles import Alignment, Font
-from openpyxl.utils import get_column_letter
 
 class ArgumentParser(argparse.ArgumentParser):
     """参数类"""
@@ -50,7 +57,29 @@ class ArgumentParser(argparse.ArgumentParser):
         """解析 id 参数, 支持空格或逗号分隔"""
         return [x.strip() for x in value.replace(',', ' ').split() if x.strip()]
 
-def parse_args():
+    def watch_map(self, value):
+        """解析常驻模式的轮询来源与间隔(单位: 秒), 如 update=600,ranking=3600,favorite, 未指定间隔时使用--watch_interval"""
+        sources = {}
+        for item in value.replace(' ', '').split(','):
+            if not item:
+                continue
+            source, _, interval = item.partition('=')
+            if source not in Watcher.sources:
+                raise argparse.ArgumentTypeError(f"无效的轮询来源: {source}, 可选 {', '.join(Watcher.sources)}")
+            sources[source] = float(interval) if interval else None
+        return sources
+
+    def endpoint_map(self, value):
+        """解析按接口指定的数值, 如 5 或 5,ComicDetail=2,ClassPage=1, 未指定接口名的数值对应 "*" """
+        values = {}
+        for item in value.replace(' ', '').split(','):
+            if not item:
+                continue
+            endpoint, _, number = item.rpartition('=')
+            values[endpoint or "*"] = float(number)
+        return values
+
+def parse_args(argv=None):
     """参数"""
     parser = ArgumentParser(
         description='bmmc - 哔哩哔哩漫画元数据请求器',
@@ -63,6 +92,7 @@ def parse_args():
     parser.add_argument('-d', '--detail', action='store_true', help=f'{Fore.RED}请求漫画详情页(确保数据完整){Fore.RESET}')
     parser.add_argument('-b', '--bonus', action='store_true', help=f'{Fore.RED}保存特典信息{Fore.RESET}')
     parser.add_argument('-f', '--fill_blank', action='store_true', help=f'{Fore.RED}仅请求未获取数据{Fore.RESET}')
+    parser.add_argument('-c', '--incremental', action='store_true', help=f'{Fore.RED}与上次输出文件对比, 仅请求列表数据有变化的漫画详情{Fore.RESET}')
     group.add_argument('-t', '--type', help='获取不同分类页面的漫画数据，详情参考参数列表')
     group.add_argument('-i', '--id', help='输入一个或多个ID, 使用空格或逗号分隔', type=parser.id_list)
     parser.add_argument('-s', '--style', help='分类页中选择风格，详情参考参数列表', type=int, default=-1)
@@ -74,15 +104,44 @@ def parse_args():
     parser.add_argument('-r', '--rank', help='排行页中选择排行类型，详情参考参数列表', type=int, default=0)
     parser.add_argument('--sdate', help='更新推荐页中选择开始日期', default=time.strftime("%Y-%m-%d", time.localtime()))
     parser.add_argument('--edate', help='更新推荐页中选择结束日期', default=time.strftime("%Y-%m-%d", time.localtime()))
-    group.add_argument('-I', '--input', help='指定读取数据的文件, 支持json、csv、xlsx')
-    parser.add_argument('-O', '--output', help='指定输出文件名以及格式, 支持json、csv、xlsx', default="metadata.json")
+    group.add_argument('-W', '--watch', help='常驻模式, 定时轮询更新推荐页、排行榜、我的追漫并只处理有变化的漫画, 如 update=600,ranking=3600', type=parser.watch_map)
+    parser.add_argument('--watch_interval', help='常驻模式默认轮询间隔(单位: 秒)', type=float, default=3600)
+    group.add_argument('-I', '--input', help='指定读取数据的文件, 支持json、jsonl、csv、xlsx、sqlite、parquet、arrow')
+    parser.add_argument('-O', '--output', help='指定输出文件名以及格式, 支持json、jsonl、csv、xlsx、sqlite(重复爬取时原地更新)、parquet、arrow(带类型的列式存储, 需安装pyarrow)', default="metadata.json")
     parser.add_argument('-w', '--workers', help='并发线程数量', type=int, default=1)
     parser.add_argument('-D', '--delay', help='如果是单线程作业, 每个请求间隔(单位: 毫秒)', type=int, default=0)
     parser.add_argument('-H', '--headers', help='请求头文件(json格式), 可包含Cookie')
     parser.add_argument('-S', '--page_size', help='指定多页请求每页数量', type=int, default=50)
     parser.add_argument('-P', '--page_num', help='指定第几页', type=int)
+    parser.add_argument('--stream', action='store_true', help='流式读取--input文件, 边读取边请求边写出, 适用于超大的输入文件')
+    parser.add_argument('--resume', action='store_true', help='从输出文件旁的断点日志(.journal)继续上次中断的任务')
+    parser.add_argument('--shards', help='将-i/-I的漫画ID按哈希、或-t update的日期范围切分为N个分片, 由多个进程或多台机器从分片队列领取执行', type=int, default=0)
+    parser.add_argument('--processes', help='分片模式下本机启动的工作进程数', type=int, default=1)
+    parser.add_argument('--queue', help='分片队列文件(sqlite), 多台机器共享同一文件即可协同执行, 默认为输出文件名加.queue')
+    parser.add_argument('--lease', help='分片租约时长(单位: 秒), 工作进程异常退出后, 租约过期的分片会被重新领取', type=float, default=300)
+    parser.add_argument('--merge', action='store_true', help='按comic_id合并分片队列中已完成分片的输出, 保存为-O指定的文件')
+    parser.add_argument('--pool_size', help='连接池大小, 默认与并发线程数一致, 为0时不复用连接', type=int)
+    parser.add_argument('--rate', help='每个接口每秒请求数上限, 可单独指定接口, 如 5,ComicDetail=3,GetComicAlbumPlus=2', type=parser.endpoint_map)
+    parser.add_argument('--burst', help='限速令牌桶容量, 允许的瞬时突发请求数', type=int, default=1)
+    parser.add_argument('--adaptive', action='store_true', help='自适应并发, 从1逐步增加至--workers, 触发412时降低并发并冷却后继续')
+    parser.add_argument('--cooldown', help='自适应并发触发412后的冷却时间(单位: 秒)', type=float, default=30)
+    parser.add_argument('--cache', help='启用本地响应缓存, 可指定缓存目录', nargs='?', const='.bmmc_cache')
+    parser.add_argument('--cache_size', help='缓存容量上限(单位: MB), 超出后淘汰最久未使用的响应', type=int, default=512)
+    parser.add_argument('--cache_ttl', help='按接口覆盖缓存有效期(单位: 秒), 如 ComicDetail=3600,ranking=600', type=parser.endpoint_map)
+    parser.add_argument('--cache_compress', action='store_true', help='压缩缓存内容')
+    parser.add_argument('--decoder', help='响应解码后端, orjson: 更快的json解析(需安装orjson), msgspec: 仅解码输出所需字段(需安装msgspec)', choices=["json", "orjson", "msgspec"], default="json")
+    parser.add_argument('--episodes', help='获取详情时将每个章节逐行写入该文件, 格式同输出文件, sqlite写入episodes表')
+    parser.add_argument('--bonus_expiring', help='获取特典后列出未来N天内下架的全部特典', type=float, metavar='DAYS')
+    parser.add_argument('--metrics', help='将各接口请求统计写入METRICS.json与METRICS.prom(Prometheus textfile格式)')
+    parser.add_argument('--metrics_interval', help='运行期间每隔多少秒写入一次请求统计, 默认仅在结束时写入', type=float, default=0)
+    parser.add_argument('--profile', help='分析各阶段耗时, 以.json结尾时输出Chrome trace(chrome://tracing或Perfetto打开), 否则输出cProfile的pstats文件')
+    parser.add_argument('--profile_memory', help='分析时使用tracemalloc记录各阶段内存峰值', action='store_true')
+    parser.add_argument('--engine', help='并发引擎, thread: 多线程, async: 异步协程(需安装aiohttp)', choices=["thread", "async"], default="thread")
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    args.argv = sys.argv[1:] if argv is None else list(argv)
+    args.telemetry = Telemetry()
+    args.profiler = Profiler(args.profile, args.profile_memory)
     if (datetime.strptime(args.edate, "%Y-%m-%d") - datetime.strptime(args.sdate, "%Y-%m-%d")).days < 0:
         parser.error(f"开始日期需要在结束日期之前: --sdate={args.sdate} > --edate={args.edate}")
     if args.type and args.type not in ("classify", "update", "ranking", "home_feed", "favorite", "buy"):
@@ -112,6 +171,67 @@ class Crawler:
             "orders": {5: "阅读热度", 6: "弹幕热度",7: "评论热度"},
         }
         self.ranking_dict = {}
+        self.base_url = "https://manga.bilibili.com"
+        self.session = self.new_session()
+        self.aclient = AsyncClient(args)
+        self.limiter = RateLimiter(args.rate, args.burst)
+        self.journal = Journal(f"{args.output}.journal")
+        self.cache = ResponseCache(args.cache, args.cache_size, args.cache_ttl, args.cache_compress)
+        # 流式读取时不缓存结果, 避免内存随输入增长
+        self.flight = SingleFlight(args.telemetry, memo=not args.stream)
+        self.keep_extras = not args.output.lower().endswith((".csv", ".xlsx") + Document.sqlite_exts + Document.columnar_exts)
+        self.keep_bonus = not args.output.lower().endswith((".csv", ".xlsx") + Document.columnar_exts)
+        self.decoder = ResponseDecoder(args.decoder, EpisodeDocument.source_fields if args.episodes else ())
+        self.episode_writer = None
+        self.bonus_index = BonusIndex()
+        if args.metrics and args.metrics_interval > 0:
+            args.telemetry.start(args.metrics, args.metrics_interval)
+        args.profiler.start()
+
+    def new_session(self) -> requests.Session:
+        """创建复用连接的会话"""
+        pool_size = self.args.workers if self.args.pool_size is None else self.args.pool_size
+        if pool_size <= 0:
+            return None
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def connection_stats(self) -> tuple:
+        """统计连接池的请求数与新建连接数"""
+        requests_count, connections_count = 0, 0
+        if self.session is None:
+            return requests_count, connections_count
+        # http与https挂载的是同一个适配器, 去重后再统计
+        for adapter in {id(adapter): adapter for adapter in self.session.adapters.values()}.values():
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools[key]
+                requests_count += pool.num_requests
+                connections_count += pool.num_connections
+        return requests_count, connections_count
+
+    def close(self):
+        """关闭会话"""
+        if self.session is not None:
+            self.session.close()
+        self.aclient.close()
+        self.journal.close()
+        if self.args.metrics:
+            self.args.telemetry.stop()
+            self.args.telemetry.write(self.args.metrics)
+        self.args.profiler.stop()
+
+    def speed_desc(self) -> str:
+        """请求速度描述"""
+        text = f"{self.args.workers}线程{f", 间隔{self.args.delay}毫秒" if self.args.delay else ""}"
+        if self.args.engine == "async":
+            text = f"{self.args.workers}并发(异步)"
+        if self.args.rate:
+            text += ", 限速" + ", ".join(f"{"每接口" if k == "*" else k}{v:g}次/秒" for k, v in self.args.rate.items())
+        return text
 
     def confirm(self, default=True):
         """确认提示"""
@@ -120,8 +240,13 @@ class Crawler:
 
         analyze_type = self.req_type.get(self.args.type)
         prompt = f"您选择了[{analyze_type}]"
-        if self.args.id and not self.args.input:
-            prompt = f"您选择了{len(self.args.id)}本漫画, 请求漫画详情速度({self.args.workers}线程{f", 间隔{self.args.delay}毫秒" if self.args.delay else ""})"
+        if self.args.watch:
+            sources = [f"[{self.req_type.get(source)}]每{interval or self.args.watch_interval:g}秒" for source, interval in self.args.watch.items()]
+            prompt = f"您选择了常驻模式, 轮询{", ".join(sources)}"
+        elif self.args.id and not self.args.input:
+            prompt = f"您选择了{len(self.args.id)}本漫画, 请求漫画详情速度({self.speed_desc()})"
+        elif self.args.input and self.args.stream:
+            prompt = f"您选择流式读取文件[{self.args.input}]"
         elif self.args.input:
             prompt = f"您输入的文件内包含了{len(self.args.id)}本漫画"
         elif self.args.type == "ranking":
@@ -137,6 +262,8 @@ class Crawler:
         if self.args.detail:
             if self.args.fill_blank:
                 prompt += ", 仅请求其中尚未爬取的漫画详情页"
+            elif self.args.incremental and not self.args.id:
+                prompt += ", 仅请求其中与上次输出相比有变化的漫画详情页"
             else:
                 prompt += ", 请求漫画详情页"
         if self.args.bonus:
@@ -145,7 +272,7 @@ class Crawler:
             else:
                 prompt += ", 请求漫画特典"
         if self.args.bonus or self.args.detail:
-            prompt += f", 请求速度为({self.args.workers}线程{f", 间隔{self.args.delay}毫秒" if self.args.delay else ""})"
+            prompt += f", 请求速度为({self.speed_desc()})"
         if self.args.output:
             prompt += f", 保存文件为[{self.args.output}]"
         prompt += ", 是否继续？(Y/n): "
@@ -161,13 +288,55 @@ class Crawler:
 
     def get(self, *args, **kwargs):
         """GET请求"""
-        kwargs['verify'] = False
-        return requests.get(*args, **kwargs)
+        return self.request("GET", *args, **kwargs)
 
     def post(self, *args, **kwargs):
         """POST请求"""
+        return self.request("POST", *args, **kwargs)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """发送请求, 命中缓存时直接返回"""
         kwargs['verify'] = False
-        return requests.post(*args, **kwargs)
+        endpoint = self.limiter.endpoint(url)
+        response = self.cache.get(method, url, kwargs.get("data"))
+        if response is not None:
+            self.args.telemetry.record_cache_hit(endpoint)
+            return response
+        self.args.telemetry.record_wait(endpoint, self.limiter.wait(url))
+        start = time.monotonic()
+        try:
+            if self.session is None:
+                response = requests.request(method, url, **kwargs)
+            else:
+                response = self.session.request(method, url, **kwargs)
+        except requests.RequestException:
+            self.args.telemetry.record_error(endpoint)
+            raise
+        self.args.telemetry.record_request(endpoint, response.status_code, time.monotonic() - start, len(response.content))
+        self.cache.put(method, url, kwargs.get("data"), response)
+        return response
+
+    async def async_post(self, *args, **kwargs):
+        """异步POST请求"""
+        return await self.async_request("POST", *args, **kwargs)
+
+    async def async_request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """异步发送请求, 命中缓存时直接返回"""
+        endpoint = self.limiter.endpoint(url)
+        response = self.cache.get(method, url, kwargs.get("data"))
+        if response is not None:
+            self.args.telemetry.record_cache_hit(endpoint)
+            return response
+        self.args.telemetry.record_wait(endpoint, await self.limiter.async_wait(url))
+        start = time.monotonic()
+        try:
+            response = await self.aclient.request(method, url, **kwargs)
+        except requests.RequestException:
+            self.args.telemetry.record_error(endpoint)
+            raise
+        self.args.telemetry.record_request(endpoint, response.status_code, time.monotonic() - start, len(response.content))
+        self.cache.put(method, url, kwargs.get("data"), response)
+        return response
 
     def get_parameter(self) -> str:
         """获取参数列表"""
@@ -220,7 +389,7 @@ class Crawler:
 
     def get_classify_label(self) -> dict:
         """获取全部分类"""
-        url = "https://manga.bilibili.com/twirp/comic.v1.Comic/AllLabel"
+        url = f"{self.base_url}/twirp/comic.v1.Comic/AllLabel"
         try:
             response = self.post(url, headers=self.headers, timeout=5)
             response.raise_for_status()
@@ -236,7 +405,7 @@ class Crawler:
         """获取分类页结果"""
         if self.args.is_risk:
             return
-        url = "https://manga.bilibili.com/twirp/comic.v1.Comic/ClassPage?mobi_app=android_comic&device=android&platform=android"
+        url = f"{self.base_url}/twirp/comic.v1.Comic/ClassPage?mobi_app=android_comic&device=android&platform=android"
         payload = {
             "style_id": style,
             "area_id": area,
@@ -274,7 +443,7 @@ class Crawler:
         """获取推荐页结果"""
         if self.args.is_risk:
             return
-        url = "https://manga.bilibili.com/twirp/comic.v1.Comic/GetDailyPush"
+        url = f"{self.base_url}/twirp/comic.v1.Comic/GetDailyPush"
         payload = {
             "date": date,
             "page_num": page_num,
@@ -282,17 +451,27 @@ class Crawler:
         }
         try:
             response = self.post(url, headers=self.headers, data=payload, timeout=5)
-            if response.status_code == 412:
-                self.args.is_risk = True
-                return
-            response.raise_for_status()
-            data = response.json().get("data", {})
-            comics = data.get("list")
-            for comic in comics:
-                comic["date"] = date
-            if comics is None:
-                return []
-            return comics
+            return self.handle_update_page(date, response)
+        except requests.exceptions.HTTPError as e:
+            raise RuntimeError(f"请求错误 {e}") from e
+        except requests.RequestException as e:
+            raise RuntimeError(f"网络错误 {e}") from e
+        except json.JSONDecodeError as e:
+            raise RuntimeError(f"返回解析错误 {e}") from e
+
+    async def async_get_update_page(self, date: str, page_num=1, page_size=100) -> dict:
+        """异步获取推荐页结果"""
+        if self.args.is_risk:
+            return
+        url = f"{self.base_url}/twirp/comic.v1.Comic/GetDailyPush"
+        payload = {
+            "date": date,
+            "page_num": page_num,
+            "page_size": page_size,
+        }
+        try:
+            response = await self.async_post(url, headers=self.headers, data=payload, timeout=5)
+            return self.handle_update_page(date, response)
         except requests.exceptions.HTTPError as e:
             raise RuntimeError(f"请求错误 {e}") from e
         except requests.RequestException as e:
@@ -300,16 +479,33 @@ class Crawler:
         except json.JSONDecodeError as e:
             raise RuntimeError(f"返回解析错误 {e}") from e
 
+    def handle_update_page(self, date: str, response: requests.Response) -> list:
+        """解析推荐页返回"""
+        if response.status_code == 412:
+            self.args.is_risk = True
+            return
+        response.raise_for_status()
+        data = response.json().get("data", {})
+        comics = data.get("list")
+        if comics is None:
+            return []
+        for comic in comics:
+            comic["date"] = date
+        return comics
+
     def get_ranking_page(self, rank_type="0") -> dict:
         """获取排行页结果"""
         if rank_type is None:
             rank_type = "0"
-        url = f"https://manga.bilibili.com/ranking/{rank_type}/index.pageContext.json"
-        try:
+        url = f"{self.base_url}/ranking/{rank_type}/index.pageContext.json"
+
+        def fetch():
             response = self.get(url, headers=self.headers, timeout=5)
             response.raise_for_status()
-            data = response.json().get("data", {})
-            return data
+            return response.json().get("data", {})
+
+        try:
+            return self.flight.do(("ranking", str(rank_type)), fetch)
         except requests.exceptions.HTTPError as e:
             raise RuntimeError(f"请求错误 {e}") from e
         except requests.RequestException as e:
@@ -321,37 +517,33 @@ class Crawler:
         """获取漫画详情页"""
         if self.args.is_risk:
             return
-        url = "https://manga.bilibili.com/twirp/comic.v1.Comic/ComicDetail?device=h5&platform=web"
-        try:
+        url = f"{self.base_url}/twirp/comic.v1.Comic/ComicDetail?device=h5&platform=web"
+
+        def fetch():
             response = self.post(url, headers=self.headers, data={"comic_id": comic_id}, timeout=5)
-            if response.status_code == 412:
-                self.args.is_risk = True
-                return
-            response.raise_for_status()
-            comic = response.json().get("data", {})
-            comic["comic_id"] = comic.get("id")
-            if comic.get("pay_mode") == 0:
-                comic["price"] = "免费"
-            elif comic.get("pay_mode") == 1:
-                comic["price"] = "付费(可漫读券)"
-            elif comic.get("pay_mode") == 2:
-                comic["price"] = "付费"
-            ep_list = comic.get("ep_list")
-            if ep_list:
-                last_episode = ep_list[0]
-                comic["last_ep_id"] = last_episode["id"]
-                comic["last_ep_title"] = f"{last_episode["short_title"]} {last_episode["title"]}"
-                comic["last_ep_date"] = last_episode["pub_time"].split(" ")[0]
-                ep_list.sort(key=lambda x: datetime.fromisoformat(x["index_last_modified"]))
-                last_modify_episode = ep_list[-1]
-                comic["last_modify_ep_id"] = last_modify_episode["id"]
-                comic["last_modify_ep_title"] = f"{last_modify_episode["short_title"]} {last_modify_episode["title"]}"
-                comic["last_modify_ep_date"] = last_modify_episode["index_last_modified"].split(" ")[0]
-                if comic["release_time"] == "":
-                    comic["release_time"] = ep_list[-1]["pub_time"].split(" ")[0]
-                else:
-                    comic["release_time"] = comic["release_time"].replace(".","-")
-            return comic
+            return self.handle_comic_details(response)
+
+        try:
+            return self.flight.do(("ComicDetail", str(comic_id)), fetch)
+        except requests.exceptions.HTTPError as e:
+            raise RuntimeError(f"请求错误 {e}") from e
+        except requests.RequestException as e:
+            raise RuntimeError(f"网络错误 {e}") from e
+        except json.JSONDecodeError as e:
+            raise RuntimeError(f"返回解析错误 {e}") from e
+
+    async def async_get_comic_details(self, comic_id: str) -> dict:
+        """异步获取漫画详情页"""
+        if self.args.is_risk:
+            return
+        url = f"{self.base_url}/twirp/comic.v1.Comic/ComicDetail?device=h5&platform=web"
+
+        async def fetch():
+            response = await self.async_post(url, headers=self.headers, data={"comic_id": comic_id}, timeout=5)
+            return self.handle_comic_details(response)
+
+        try:
+            return await self.flight.async_do(("ComicDetail", str(comic_id)), fetch)
         except requests.exceptions.HTTPError as e:
             raise RuntimeError(f"请求错误 {e}") from e
         except requests.RequestException as e:
@@ -359,19 +551,93 @@ class Crawler:
         except json.JSONDecodeError as e:
             raise RuntimeError(f"返回解析错误 {e}") from e
 
+    def handle_comic_details(self, response: requests.Response) -> dict:
+        """解析漫画详情页返回"""
+        if response.status_code == 412:
+            self.args.is_risk = True
+            return
+        response.raise_for_status()
+        comic = self.decoder.comic_details(response.content, project=not self.keep_extras)
+        comic["comic_id"] = comic.get("id")
+        if comic.get("pay_mode") == 0:
+            comic["price"] = "免费"
+        elif comic.get("pay_mode") == 1:
+            comic["price"] = "付费(可漫读券)"
+        elif comic.get("pay_mode") == 2:
+            comic["price"] = "付费"
+        ep_list = comic.get("ep_list")
+        if ep_list:
+            last_episode = last_modify_episode = ep_list[0]
+            for episode in ep_list:
+                # 时间格式固定为 YYYY-MM-DD HH:MM:SS, 字符串比较即时间先后, 相同时取靠后的章节
+                if episode["index_last_modified"] >= last_modify_episode["index_last_modified"]:
+                    last_modify_episode = episode
+            comic["last_ep_id"] = last_episode["id"]
+            comic["last_ep_title"] = f"{last_episode["short_title"]} {last_episode["title"]}"
+            comic["last_ep_date"] = last_episode["pub_time"].split(" ")[0]
+            comic["last_modify_ep_id"] = last_modify_episode["id"]
+            comic["last_modify_ep_title"] = f"{last_modify_episode["short_title"]} {last_modify_episode["title"]}"
+            comic["last_modify_ep_date"] = last_modify_episode["index_last_modified"].split(" ")[0]
+            if comic["release_time"] == "":
+                comic["release_time"] = last_modify_episode["pub_time"].split(" ")[0]
+            else:
+                comic["release_time"] = comic["release_time"].replace(".","-")
+            if self.episode_writer is not None:
+                rows = [EpisodeDocument.row(comic["comic_id"], episode) for episode in ep_list]
+                for row in rows:
+                    self.episode_writer.write(row)
+                # 续传时已完成的漫画不再请求详情, 其章节从断点日志写回
+                self.journal.append("episodes", str(comic["comic_id"]), rows)
+        return ComicRecord(comic, self.keep_extras)
+
+    def replay_episodes(self):
+        """续传时将断点日志中已完成漫画的章节重新写入章节文件"""
+        if self.episode_writer is None or not self.args.resume:
+            return
+        episodes = self.journal.load("episodes")
+        if not episodes:
+            return
+        done = {str(key) for key in self.journal.load("detail")}
+        done |= {str(result[1].get("comic_id")) for result in self.journal.load("stream").values()}
+        replayed = 0
+        for comic_id, rows in episodes.items():
+            if comic_id in done:
+                for row in rows:
+                    self.episode_writer.write(row)
+                replayed += 1
+        tqdm.write(f"{Fore.GREEN}已从断点日志恢复{replayed}本漫画的章节{Fore.RESET}")
+
     def get_comic_bonus(self, comic_id: str) -> dict:
         """获取漫画特典页"""
         if comic_id is None or self.args.is_risk:
             return
-        url = "https://manga.bilibili.com/twirp/comic.v1.Comic/GetComicAlbumPlus?mobi_app=android_comic&device=android&platform=android&version=6.17.1"
-        try:
+        url = f"{self.base_url}/twirp/comic.v1.Comic/GetComicAlbumPlus?mobi_app=android_comic&device=android&platform=android&version=6.17.1"
+
+        def fetch():
             response = self.post(url, headers=self.headers, data={"comic_id": comic_id}, timeout=5)
-            if response.status_code == 412:
-                self.args.is_risk = True
-                return
-            response.raise_for_status()
-            data = response.json().get("data", {}).get("list", {})
-            return [comic_id, data]
+            return self.handle_comic_bonus(comic_id, response)
+
+        try:
+            return self.flight.do(("GetComicAlbumPlus", str(comic_id)), fetch)
+        except requests.exceptions.HTTPError as e:
+            raise RuntimeError(f"请求错误 {e}") from e
+        except requests.RequestException as e:
+            raise RuntimeError(f"网络错误 {e}") from e
+        except json.JSONDecodeError as e:
+            raise RuntimeError(f"返回解析错误 {e}") from e
+
+    async def async_get_comic_bonus(self, comic_id: str) -> dict:
+        """异步获取漫画特典页"""
+        if comic_id is None or self.args.is_risk:
+            return
+        url = f"{self.base_url}/twirp/comic.v1.Comic/GetComicAlbumPlus?mobi_app=android_comic&device=android&platform=android&version=6.17.1"
+
+        async def fetch():
+            response = await self.async_post(url, headers=self.headers, data={"comic_id": comic_id}, timeout=5)
+            return self.handle_comic_bonus(comic_id, response)
+
+        try:
+            return await self.flight.async_do(("GetComicAlbumPlus", str(comic_id)), fetch)
         except requests.exceptions.HTTPError as e:
             raise RuntimeError(f"请求错误 {e}") from e
         except requests.RequestException as e:
@@ -379,11 +645,20 @@ class Crawler:
         except json.JSONDecodeError as e:
             raise RuntimeError(f"返回解析错误 {e}") from e
 
+    def handle_comic_bonus(self, comic_id: str, response: requests.Response) -> list:
+        """解析漫画特典页返回"""
+        if response.status_code == 412:
+            self.args.is_risk = True
+            return
+        response.raise_for_status()
+        data = self.decoder.comic_bonus(response.content, project=not self.keep_extras)
+        return [comic_id, self.summarize_bonus(comic_id, data)]
+
     def get_home_feeds(self, buvid=None, page_num=1, page_size=100) -> dict:
         """获取主页信息流结果"""
         if self.args.is_risk:
             return
-        url = "https://manga.bilibili.com/twirp/comic.v1.Home/HomeFeed"
+        url = f"{self.base_url}/twirp/comic.v1.Home/HomeFeed"
         if buvid is None:
             mac = ':'.join(''.join(random.choices('0123456789ABCDEF', k=2)) for _ in range(6))
             h = hashlib.md5(mac.replace(':', '').replace('-', '').encode()).hexdigest().upper()
@@ -422,7 +697,7 @@ class Crawler:
 
     def get_favorite(self, page_num=1, page_size=100, order=0) -> dict:
         """获取我的追漫"""
-        url = "https://manga.bilibili.com/twirp/bookshelf.v1.Bookshelf/ListFavorite?device=pc&platform=web"
+        url = f"{self.base_url}/twirp/bookshelf.v1.Bookshelf/ListFavorite?device=pc&platform=web"
         payload = {
             "page_num": page_num,
             "page_size": page_size,
@@ -452,7 +727,7 @@ class Crawler:
 
     def get_buy_comics(self, page_num=1, page_size=100) -> dict:
         """获取已购漫画"""
-        url = "https://manga.bilibili.com/twirp/user.v1.User/GetAutoBuyComics?device=pc&platform=web"
+        url = f"{self.base_url}/twirp/user.v1.User/GetAutoBuyComics?device=pc&platform=web"
         payload = {
             "page_num": page_num,
             "page_size": page_size,
@@ -479,146 +754,388 @@ class Crawler:
         except json.JSONDecodeError as e:
             raise RuntimeError(f"返回解析错误 {e}") from e
 
-    def get_comics_details(self, comic_id_list: list=None, comics: list=None):
-        """批量获取漫画详情"""
+    def get_comics_details(self, comic_id_list: list=None, comics: list=None, on_record=None):
+        """批量获取漫画详情, on_record 在每本漫画数据完整后立即回调"""
         task_list = []
+        key_list = []
+        fetch = self.async_get_comic_details if self.args.engine == "async" else self.get_comic_details
+        pending = {}
+        requested = set()
         if comics:
-            for comic in comics:
-                if self.args.fill_blank and comic.get("last_ep_title"):
+            # 同一漫画在列表中多次出现时只请求一次, 结果回填到每次出现的位置, 没有id的漫画原样保留
+            comics = list(comics)
+            for index, comic in enumerate(comics):
+                comic_id = comic.get("comic_id")
+                if comic_id in (None, ""):
                     continue
-                task_list.append(lambda comic_id=comic["comic_id"]: self.get_comic_details(comic_id))
+                if str(comic_id) not in requested and not (self.args.fill_blank and comic.get("last_ep_title")):
+                    requested.add(str(comic_id))
+                    task_list.append(lambda comic_id=comic_id: fetch(comic_id))
+                    key_list.append(comic_id)
+                pending.setdefault(str(comic_id), []).append(index)
         else:
             for comic_id in comic_id_list:
-                task_list.append(lambda comic_id=comic_id: self.get_comic_details(comic_id))
+                task_list.append(lambda comic_id=comic_id: fetch(comic_id))
+                key_list.append(comic_id)
+
+        if comics:
+            def on_result(item):
+                for index in pending.pop(str(item.get("comic_id")), []):
+                    comics[index] = ComicRecord(comics[index], self.keep_extras)
+                    comics[index].update(item)
+                    if on_record:
+                        on_record(comics[index])
+        else:
+            on_result = on_record
         tr = TaskRunner(
             self.args,
             task_list,
-            title="批量请求漫画详情"
+            title="批量请求漫画详情",
+            aclient=self.aclient,
+            keys=key_list,
+            journal=self.journal,
+            stage="detail",
+            on_result=on_result
         )
         tr.start()
         if comics:
-            req_comics = {}
-            for item in tr.results:
-                req_comics[item.get("comic_id")] = item
-            for comic in comics:
-                comic_id = comic.get("comic_id")
-                if int(comic_id) in req_comics:
-                    comic.update(req_comics[int(comic_id)])
+            if on_record:
+                for comic in comics:
+                    if comic.get("comic_id") in (None, "") or str(comic.get("comic_id")) in pending:
+                        on_record(comic)
         else:
             comics = tr.results
         return comics
 
+    def is_changed(self, comic: dict, previous: dict) -> bool:
+        """根据列表数据判断漫画相比上次快照是否有变化, 无可比较字段时视为有变化"""
+        finish_text = {-1: "预更新", 0: "连载中", 1: "已完结"}
+        checks = 0
+        total = comic.get("total")
+        if total not in (None, "") and previous.get("total") not in (None, ""):
+            checks += 1
+            if str(total) != str(previous["total"]):
+                return True
+        is_finish = comic.get("is_finish")
+        if is_finish not in (None, "") and previous.get("is_finish") not in (None, ""):
+            checks += 1
+            if finish_text.get(is_finish, is_finish) != finish_text.get(previous["is_finish"], previous["is_finish"]):
+                return True
+        short_title = comic.get("last_short_title") or comic.get("short_title") or comic.get("last_ep_title")
+        last_ep_title = previous.get("last_ep_title")
+        if short_title and last_ep_title:
+            checks += 1
+            if last_ep_title != short_title and not last_ep_title.startswith(f"{short_title} "):
+                return True
+        ep_id = comic.get("ep_id")
+        if ep_id and previous.get("last_ep_id"):
+            checks += 1
+            if str(ep_id) != str(previous["last_ep_id"]):
+                return True
+        return checks == 0
+
+    def get_comics_details_incremental(self, comics: list, snapshot: list, on_record=None) -> list:
+        """仅请求相比上次快照有变化的漫画详情, 其余沿用快照数据"""
+        previous = {str(row.get("comic_id")): row for row in snapshot}
+        changed_ids = []
+        for comic in comics:
+            comic_id = str(comic.get("comic_id"))
+            if comic_id not in previous or self.is_changed(comic, previous[comic_id]):
+                changed_ids.append(comic.get("comic_id"))
+            elif on_record:
+                on_record(previous[comic_id])
+        tqdm.write(f"{Fore.YELLOW}增量更新: 共{len(comics)}本漫画, 其中{len(changed_ids)}本相比上次输出有变化{Fore.RESET}")
+        details = {}
+        if changed_ids:
+            for comic in self.get_comics_details(changed_ids, on_record=on_record):
+                details[str(comic.get("comic_id"))] = comic
+        result = []
+        for comic in comics:
+            comic_id = str(comic.get("comic_id"))
+            if comic_id in details:
+                result.append(details[comic_id])
+            elif comic_id in previous:
+                result.append(previous[comic_id])
+        if on_record:
+            for comic_id in {str(i) for i in changed_ids} - details.keys():
+                if comic_id in previous:
+                    on_record(previous[comic_id])
+        return result
+
+    def get_pages_all(self, fetch, title: str) -> list:
+        """并发预取后续分页, 遇到空页或请求失败后不再请求更后的页, 按页码顺序合并结果
+        某页请求失败时抛出异常, 触发限频且未能重试时只返回缺页之前的结果"""
+        start = self.args.page_num if self.args.page_num else 1
+        pages = [start] if self.args.page_num else count(start)
+        errors = {}
+
+        def fetch_page(page_num):
+            try:
+                page = fetch(page_num)
+            except Exception as e:
+                errors[page_num] = e
+                tr.stop()
+                raise
+            if page is None:
+                # 触发限频, 自适应并发时该页会在冷却后重试, 后续分页照常请求
+                return None
+            if len(page) == 0:
+                tr.stop()
+            return [page_num, page]
+
+        tr = TaskRunner(
+            self.args,
+            (lambda page_num=page_num: fetch_page(page_num) for page_num in pages),
+            title=title,
+            unit="页",
+            is_dict=True
+        )
+        tr.start()
+        data = []
+        page_num = start
+        while tr.results.get(page_num):
+            data += tr.results[page_num]
+            page_num += 1
+        if errors:
+            first = min(errors)
+            raise RuntimeError(f"[{title}]第{first}页请求失败: {errors[first]}") from errors[first]
+        dropped = sum(1 for key, page in tr.results.items() if key > page_num and page)
+        if dropped:
+            tqdm.write(f"{Fore.YELLOW}[{title}]第{page_num}页未能获取, 舍弃其后已获取的{dropped}页{Fore.RESET}")
+        return data
+
     def get_classify_page_all(self):
         """获取全部分类页"""
-        data = []
-        page = [{}]
-        page_num = self.args.page_num if self.args.page_num else 1
-        with tqdm(desc=f"分类页加载中({self.args.page_size}本/页)", unit="页") as process_bar:
-            while len(page) > 0:
-                page = self.get_classify_page(
-                    style=self.args.style,
-                    area=self.args.area,
-                    status=self.args.status,
-                    order=self.args.order,
-                    special=self.args.special,
-                    price=self.args.price,
-                    page_size=self.args.page_size,
-                    page_num=page_num
-                )
-                if not page or len(page) == 0:
-                    break
-                data += page
-                page_num += 1
-                process_bar.update(1)
-                if self.args.page_num:
-                    break
-                if self.args.delay > 0:
-                    time.sleep(self.args.delay / 1000)
+        data = self.get_pages_all(
+            lambda page_num: self.get_classify_page(
+                style=self.args.style,
+                area=self.args.area,
+                status=self.args.status,
+                order=self.args.order,
+                special=self.args.special,
+                price=self.args.price,
+                page_size=self.args.page_size,
+                page_num=page_num
+            ),
+            title=f"分类页加载({self.args.page_size}本/页)"
+        )
         tqdm.write(f"{Fore.GREEN}加载完毕, 共{len(data)}本漫画{Fore.RESET}")
         return data
 
-    def get_update_page_all(self):
-        """批量获取更新推荐页"""
-        task_list = []
-
-        start = datetime.strptime(self.args.sdate, "%Y-%m-%d")
-        end = datetime.strptime(self.args.edate, "%Y-%m-%d")
-        current = start
+    def get_update_page_all(self, sdate: str=None, edate: str=None, page_size=100, depth=1) -> list:
+        """批量获取更新推荐页, 各日期并行请求第一页, 某页取满时立即追加同一日期之后的depth页, 直到取到不满的一页
+        任务键为"日期#页码", 续传时已完成的分页直接合并"""
+        days = []
+        current = datetime.strptime(sdate or self.args.sdate, "%Y-%m-%d")
+        end = datetime.strptime(edate or self.args.edate, "%Y-%m-%d")
         while current <= end:
-            task_list.append(lambda date=current.strftime("%Y-%m-%d"): self.get_update_page(date))
+            days.append(current.strftime("%Y-%m-%d"))
             current += timedelta(days=1)
+
+        if self.args.engine == "async":
+            async def fetch_page(day, page_num):
+                comics = await self.async_get_update_page(day, page_num, page_size)
+                return None if comics is None else [f"{day}#{page_num}", comics]
+        else:
+            def fetch_page(day, page_num):
+                comics = self.get_update_page(day, page_num, page_size)
+                return None if comics is None else [f"{day}#{page_num}", comics]
+
+        issued = dict.fromkeys(days, 1)
+        last_page = {}
+
+        def on_result(result):
+            day, page_num = result[0].rsplit("#", 1)
+            page_num = int(page_num)
+            if len(result[1]) < page_size:
+                last_page[day] = min(page_num, last_page.get(day, page_num))
+                return
+            # 已知最后一页后不再追加, 已发出的更后分页返回空页
+            while day not in last_page and issued[day] < page_num + depth:
+                issued[day] += 1
+                tr.submit(lambda day=day, page_num=issued[day]: fetch_page(day, page_num), f"{day}#{issued[day]}")
+
         tr = TaskRunner(
             self.args,
-            task_list,
+            [lambda day=day: fetch_page(day, 1) for day in days],
             title="批量获取更新推荐页",
-            unit="页"
+            unit="页",
+            is_dict=True,
+            aclient=self.aclient,
+            keys=[f"{day}#1" for day in days],
+            journal=self.journal,
+            stage="update",
+            on_result=on_result
         )
         tr.start()
         comics = []
-        for daily_comics in tr.results:
-            comics += daily_comics
-        comics = sorted(comics, key=lambda x: x["date"])
+        for day in days:
+            page_num = 1
+            while f"{day}#{page_num}" in tr.results:
+                comics += tr.results[f"{day}#{page_num}"]
+                page_num += 1
         return comics
 
     def get_home_feeds_all(self) -> dict:
         """获取全部主页信息流"""
-        data = []
-        page = [{}]
-        page_num = self.args.page_num if self.args.page_num else 1
         mac = ':'.join(''.join(random.choices('0123456789ABCDEF', k=2)) for _ in range(6))
         h = hashlib.md5(mac.replace(':', '').replace('-', '').encode()).hexdigest().upper()
         buvid = 'XX' + (h[2] + h[12] + h[22] if len(h) >= 23 else '000') + h
         print(f"{Fore.YELLOW}本次主页信息流使用buvid={buvid}{Fore.RESET}")
-        with tqdm(desc=f"主页信息流加载中({self.args.page_size}本/页)", unit="页") as process_bar:
-            while len(page) > 0:
-                page = self.get_home_feeds(
-                    buvid=buvid,
-                    page_size=self.args.page_size,
-                    page_num=page_num
-                )
-                if not page or len(page) == 0:
-                    break
-                data += page
-                page_num += 1
-                process_bar.update(1)
-                if self.args.page_num:
-                    break
-                if self.args.delay > 0:
-                    time.sleep(self.args.delay / 1000)
+        data = self.get_pages_all(
+            lambda page_num: self.get_home_feeds(
+                buvid=buvid,
+                page_size=self.args.page_size,
+                page_num=page_num
+            ),
+            title=f"主页信息流加载({self.args.page_size}本/页)"
+        )
         tqdm.write(f"{Fore.GREEN}主页信息流加载完毕, 共{len(data)}本漫画{Fore.RESET}")
         return data
 
-    def get_comic_bonus_all(self, comics: list) -> dict:
-        """批量获取漫画特典页"""
+    def get_comic_bonus_all(self, comics: list, on_record=None) -> dict:
+        """批量获取漫画特典页, on_record 在每本漫画数据完整后立即回调"""
         task_list = []
+        key_list = []
+        fetch = self.async_get_comic_bonus if self.args.engine == "async" else self.get_comic_bonus
+        pending = {}
         for comic in comics:
-            if self.args.fill_blank and comic.get("bonus_total"):
+            pending.setdefault(str(comic.get("comic_id")), []).append(comic)
+        for comic_id, group in pending.items():
+            # 同一漫画只请求一次, 结果回填到每次出现的位置
+            if self.args.fill_blank and all(comic.get("bonus_total") for comic in group):
                 continue
-            task_list.append(lambda comic_id=comic.get("comic_id"): self.get_comic_bonus(comic_id))
+            task_list.append(lambda comic_id=group[0].get("comic_id"): fetch(comic_id))
+            key_list.append(group[0].get("comic_id"))
+
+        def on_result(result):
+            comic_id, summary = result
+            for comic in pending.pop(str(comic_id), []):
+                self.bonus_index.name(comic_id, comic.get("title"))
+                comic.update(summary)
+                if on_record:
+                    on_record(comic)
+
         tr = TaskRunner(
             self.args,
             task_list,
             title="批量请求漫画特典",
-            is_dict=True
+            is_dict=True,
+            aclient=self.aclient,
+            keys=key_list,
+            journal=self.journal,
+            stage="bonus",
+            on_result=on_result
         )
         tr.start()
-        for comic in comics:
-            comic_id = comic.get("comic_id")
-            if comic_id in tr.results:
-                bonus = tr.results[comic_id]
-                comic["bonus"] = bonus
-                comic["bonus_total"] = len(bonus)
-                if len(bonus) == 0:
-                    continue
-                comic["last_bonus_title"] = max(bonus, key=lambda x: x["item"]["online_time"])["item"]["title"]
-                comic["last_bonus_date"] = max(bonus, key=lambda x: x["item"]["online_time"])["item"]["online_time"].split(" ")[0]
-                future_bonus = [item for item in bonus if datetime.strptime(item["item"]["offline_time"].split(" ")[0], '%Y-%m-%d') > datetime.today()]
-                if len(future_bonus) == 0:
-                    continue
-                comic["recently_lock_bonus_title"] = min(future_bonus, key=lambda x: x["item"]["offline_time"])["item"]["title"]
-                comic["recently_lock_bonus_date"] = min(future_bonus, key=lambda x: x["item"]["offline_time"])["item"]["offline_time"].split(" ")[0]
+        if on_record:
+            for rest in pending.values():
+                for comic in rest:
+                    on_record(comic)
         return comics
 
+    def summarize_bonus(self, comic_id, bonus: list) -> dict:
+        """一次遍历汇总漫画特典信息并登记尚未下架的特典, 原始特典列表仅在输出json或sqlite时保留
+        时间均为"%Y-%m-%d %H:%M:%S"格式, 直接按字符串比较, 无需逐条解析"""
+        summary = {"bonus": bonus} if self.keep_bonus else {}
+        summary["bonus_total"] = len(bonus)
+        if len(bonus) == 0:
+            return summary
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        today = now[:10]
+        last, lock, upcoming = None, None, []
+        for entry in bonus:
+            item = entry["item"]
+            if last is None or item["online_time"] > last["online_time"]:
+                last = item
+            # 索引收录今天稍后下架的特典, 汇总字段沿用按日期判断: 下架日期晚于今天
+            if item["offline_time"] > now:
+                upcoming.append(item)
+            if item["offline_time"][:10] > today and (lock is None or item["offline_time"] < lock["offline_time"]):
+                lock = item
+        summary["last_bonus_title"] = last["title"]
+        summary["last_bonus_date"] = last["online_time"][:10]
+        self.bonus_index.add(comic_id, upcoming)
+        if lock is None:
+            return summary
+        summary["recently_lock_bonus_title"] = lock["title"]
+        summary["recently_lock_bonus_date"] = lock["offline_time"][:10]
+        return summary
+
+    def stream_stages(self, comic: dict) -> tuple:
+        """流式补全时该漫画需要请求的阶段(详情, 特典)"""
+        detail = (self.args.detail or not self.args.bonus) and not (self.args.fill_blank and comic.get("last_ep_title"))
+        bonus = self.args.bonus and not (self.args.fill_blank and comic.get("bonus_total"))
+        return detail, bonus
+
+    def enrich(self, comic: dict, pending: dict, index: int):
+        """依次请求单本漫画的详情与特典, 中途失败时pending中保留已获取的部分"""
+        detail, bonus = self.stream_stages(comic)
+        record = comic
+        if detail:
+            item = self.get_comic_details(comic["comic_id"])
+            if item is None:
+                return
+            record = pending[index] = ComicRecord(comic, self.keep_extras)
+            record.update(item)
+        if bonus:
+            result = self.get_comic_bonus(record.get("comic_id"))
+            if result is None:
+                return
+            self.bonus_index.name(record.get("comic_id"), record.get("title"))
+            record.update(result[1])
+        return [index, record]
+
+    async def async_enrich(self, comic: dict, pending: dict, index: int):
+        """异步依次请求单本漫画的详情与特典"""
+        detail, bonus = self.stream_stages(comic)
+        record = comic
+        if detail:
+            item = await self.async_get_comic_details(comic["comic_id"])
+            if item is None:
+                return
+            record = pending[index] = ComicRecord(comic, self.keep_extras)
+            record.update(item)
+        if bonus:
+            result = await self.async_get_comic_bonus(record.get("comic_id"))
+            if result is None:
+                return
+            self.bonus_index.name(record.get("comic_id"), record.get("title"))
+            record.update(result[1])
+        return [index, record]
+
+    def enrich_stream(self, records, on_record):
+        """流式补全漫画数据, 边读取边请求边写出, 不在内存中保留全部漫画"""
+        fetch = self.async_enrich if self.args.engine == "async" else self.enrich
+        pending = {}
+
+        def tasks():
+            for index, comic in enumerate(records):
+                pending[index] = comic
+                yield lambda comic=comic, index=index: fetch(comic, pending, index)
+
+        def on_result(result):
+            index, record = result
+            pending.pop(index, None)
+            on_record(record)
+
+        tr = TaskRunner(
+            self.args,
+            tasks(),
+            title="流式补全漫画数据",
+            aclient=self.aclient,
+            keys=count(),
+            journal=self.journal,
+            stage="stream",
+            on_result=on_result,
+            keep_results=False
+        )
+        tr.start()
+        for record in pending.values():
+            on_record(record)
+        for comic in records:
+            on_record(comic)
+
     def get_favorite_all(self) -> dict:
         """获取全部我的追漫"""
         comics = self.get_favorite("1", "1000", self.args.order)
@@ -632,20 +1149,27 @@ class Crawler:
 class TaskRunner:
     """任务类"""
     def __init__(self, args, tasks, retries=0, retry_delay=1,
-                 title="", unit="个", is_dict=False):
+                 title="", unit="个", is_dict=False, aclient=None,
+                 keys=None, journal=None, stage=None, on_result=None, keep_results=True):
         """
         :param args: 参数列表
-        :param tasks: List[Any] 要处理的任务列表
-        :param concurrent: bool 是否并发执行任务
+        :param tasks: Iterable[Callable] 要处理的任务, 可为惰性生成器
         :param retries: int 每个任务失败后的最大重试次数
-        :param retry_delay: float 每次重试之间的等待时间（秒）
+        :param retry_delay: float 每次重试之间的等待时间（毫秒）
         :param title: str 展示的进度描述
         :param unit: str 进度单位
         :param is_dict: bool 是否按字典方式处理结果
+        :param aclient: AsyncClient 异步引擎使用的请求客户端
+        :param keys: Iterable 与任务一一对应的键, 用于断点续传
+        :param journal: Journal 断点日志, 每完成一个任务写入一条
+        :param stage: str 断点日志中区分不同批量任务的阶段名
+        :param on_result: Callable 每得到一个结果时立即回调
+        :param keep_results: bool 是否在results中保留结果, 流式处理时只通过on_result传出
         """
         self.args = args
         self.tasks = tasks
-        self.concurrent = True if args.workers > 1 else False
+        self.adaptive = self.args.adaptive
+        self.concurrent = True if args.workers > 1 or self.adaptive else False
         self.delay = self.args.delay
         self.max_workers = self.args.workers
         self.retries = retries
@@ -653,97 +1177,1220 @@ class TaskRunner:
         self.title = title
         self.unit = unit
         self.is_dict = is_dict
+        self.aclient = aclient
+        self.controller = ConcurrencyController(self.max_workers, cooldown=self.args.cooldown) if self.adaptive else None
+        self.keys = keys
+        self.journal = journal if keys is not None else None
+        self.stage = stage
+        self.on_result = on_result
+        self.keep_results = keep_results
 
         self.results = {} if is_dict else []
-        self.total = len(tasks)
+        self.total = len(tasks) if hasattr(tasks, "__len__") else None
         self._lock = Lock()
+        self._retry = deque()
+        self._follow = deque()
+        self._finished = {}
+        self._exhausted = False
+        self._process_bar = None
+        self._resumed = 0
+        self._stopped = False
 
     def _execute_task(self, task):
         result = None
-        for attempt in range(1, self.retries + 2):  # 尝试次数 = 重试次数 + 第一次
-            try:
-                result = task()
-                break
-            except Exception:
-                print(f"多线程执行出现错误 {traceback.format_exc()}")
-                if attempt <= self.retries:
-                    time.sleep(self.retry_delay / 1000)
+        with self.args.profiler.task(self.stage or self.title):
+            for attempt in range(1, self.retries + 2):  # 尝试次数 = 重试次数 + 第一次
+                try:
+                    result = task()
+                    break
+                except Exception:
+                    print(f"多线程执行出现错误 {traceback.format_exc()}")
+                    self.args.telemetry.record_task_error(self.stage or self.title, attempt <= self.retries)
+                    if attempt <= self.retries:
+                        time.sleep(self.retry_delay / 1000)
+        return result
+
+    def _timed_task(self, task):
+        start = time.monotonic()
+        return self._execute_task(task), time.monotonic() - start
+
+    async def _async_execute_task(self, task):
+        import asyncio
+        result = None
+        with self.args.profiler.task(self.stage or self.title, asynchronous=True):
+            for attempt in range(1, self.retries + 2):
+                try:
+                    result = await task()
+                    break
+                except Exception:
+                    print(f"异步执行出现错误 {traceback.format_exc()}")
+                    self.args.telemetry.record_task_error(self.stage or self.title, attempt <= self.retries)
+                    if attempt <= self.retries:
+                        await asyncio.sleep(self.retry_delay / 1000)
         return result
 
+    async def _async_timed_task(self, task):
+        start = time.monotonic()
+        return await self._async_execute_task(task), time.monotonic() - start
+
+    def _collect(self, result, key=None):
+        with self._lock:
+            if result is not None:
+                if self.keep_results and self.is_dict:
+                    self.results[result[0]] = result[1]
+                elif self.keep_results:
+                    self.results.append(result)
+                if self.journal and key is not None:
+                    self.journal.append(self.stage, key, result)
+                if self.on_result:
+                    self.on_result(result)
+
+    def _resume(self, key) -> bool:
+        """任务已记录在断点日志中时合并其结果并跳过"""
+        if key is None or key not in self._finished:
+            return False
+        self._collect(self._finished[key])
+        self._resumed += 1
+        self._process_bar.update(1)
+        return True
+
+    def _pending(self):
+        """生成(键, 任务), 续传时跳过断点日志中已完成的任务并合并其结果"""
+        keys = self.keys if self.keys is not None else repeat(None)
+        self._finished = self.journal.load(self.stage) if self.journal and self.args.resume else {}
+        for key, task in zip(keys, self.tasks):
+            if self._stopped:
+                return
+            if self._resume(key):
+                continue
+            yield key, task
+
+    def stop(self):
+        """不再取出新任务, 已发出的请求照常完成"""
+        self._stopped = True
+        self._follow.clear()
+
+    def submit(self, task, key=None):
+        """追加后续任务(如分页未取完时的下一页), 排在限频退回的任务之后、尚未取出的任务之前
+        只应在 on_result 回调中调用"""
+        if self._stopped:
+            return
+        self._follow.append((key, task))
+        if self.total is not None:
+            self.total += 1
+            self._process_bar.total = self.total
+            self._process_bar.refresh()
+
+    def _next_task(self, tasks):
+        """取出下一个任务, 优先取出被限频退回的任务, 其次是追加的后续任务, 没有可取的任务时返回None"""
+        if self._retry:
+            return self._retry.popleft()
+        while self._follow and not self._stopped:
+            item = self._follow.popleft()
+            if not self._resume(item[0]):
+                return item
+        if self._exhausted:
+            return None
+        item = next(tasks, None)
+        if item is None:
+            self._exhausted = True
+        return item
+
+    def _limit(self) -> int:
+        """当前允许的同时请求数"""
+        if self.controller:
+            return self.controller.limit
+        return self.max_workers
+
+    def _paused(self, running: dict) -> float:
+        """限频冷却剩余时间, 冷却结束且请求全部返回后解除限频标记"""
+        if self.controller is None:
+            return 0
+        remaining = self.controller.cooldown_remaining()
+        if remaining > 0:
+            return remaining
+        if self.args.is_risk:
+            if running:
+                return 0.1
+            self.args.is_risk = False
+        return 0
+
+    def _done(self, item, result, elapsed) -> bool:
+        """处理完成的任务, 返回是否终止全部任务"""
+        if self.args.is_risk and result is None:
+            self.args.telemetry.record_throttle(self.stage or self.title)
+            if self.controller is None:
+                return True
+            self._retry.append(item)
+            if not self.controller.on_throttle():
+                tqdm.write(f"{Fore.YELLOW}连续{self.controller.throttles}次触发限频, 停止{self.title}{Fore.RESET}")
+                return True
+            tqdm.write(f"{Fore.YELLOW}触发限频, 并发降至{self.controller.limit}, 冷却{self.controller.cooldown}秒后继续{Fore.RESET}")
+            return False
+        if self.controller:
+            self.controller.on_success(elapsed)
+            self._process_bar.set_postfix_str(self.controller.postfix())
+        self._collect(result, item[0])
+        self._process_bar.update(1)
+        return self.args.is_risk and self.controller is None
+
     def start(self):
-        if self.concurrent:
+        start = time.monotonic()
+        if self.args.engine == "async" and self.aclient:
+            self._run_async()
+        elif self.concurrent:
             self._run_concurrent()
         else:
             self._run_sequential()
+        self.args.telemetry.record_stage(self.stage or self.title, time.monotonic() - start, self._process_bar.n)
+        if self.controller:
+            self.controller.report(self.title, self.unit)
+        if self._resumed:
+            tqdm.write(f"{Fore.GREEN}[{self.title}]已从断点日志恢复{self._resumed}{self.unit}{Fore.RESET}")
 
     def _run_sequential(self):
-        for task in tqdm(self.tasks, desc=f"{self.title}中", unit=self.unit):
-            if self.args.is_risk:
-                return
-            result = self._execute_task(task)
-            with self._lock:
-                if result is not None:
-                    if self.is_dict:
-                        self.results[result[0]] = result[1]
-                    else:
-                        self.results.append(result)
-            if self.delay > 0:
-                time.sleep(self.delay / 1000)
+        with tqdm(total=self.total, desc=f"{self.title}中", unit=self.unit) as self._process_bar:
+            tasks = self._pending()
+            while (item := self._next_task(tasks)) is not None:
+                key, task = item
+                if self.args.is_risk:
+                    return
+                result = self._execute_task(task)
+                self._collect(result, key)
+                self._process_bar.update(1)
+                if self.delay > 0:
+                    time.sleep(self.delay / 1000)
 
     def _run_concurrent(self):
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            future_to_task = {executor.submit(self._execute_task, task): task for task in self.tasks}
-            for future in tqdm(as_completed(future_to_task), total=len(self.tasks), desc=f"{self.title}中", unit=self.unit):
-                if self.args.is_risk:
+        tasks = self._pending()
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor, \
+                tqdm(total=self.total, desc=f"{self.title}中", unit=self.unit) as self._process_bar:
+            while True:
+                paused = self._paused(running)
+                while not paused and len(running) < self._limit():
+                    item = self._next_task(tasks)
+                    if item is None:
+                        break
+                    running[executor.submit(self._timed_task, item[1])] = item
+                if not running:
+                    if self._retry or self._follow or (paused and not self._exhausted):
+                        time.sleep(paused)
+                        continue
+                    return
+                done, _ = wait(running, timeout=paused or None, return_when=FIRST_COMPLETED)
+                stop = False
+                for future in done:
+                    item = running.pop(future)
+                    result, elapsed = future.result()
+                    stop = self._done(item, result, elapsed) or stop
+                if stop:
+                    for future in as_completed(running):
+                        self._collect(future.result()[0], running[future][0])
                     return
-                result = future.result()
+
+    def _run_async(self):
+        self.aclient.run(self._gather())
+
+    async def _gather(self):
+        import asyncio
+        tasks = self._pending()
+        running = {}
+        try:
+            with tqdm(total=self.total, desc=f"{self.title}中", unit=self.unit) as self._process_bar:
+                while True:
+                    paused = self._paused(running)
+                    while not paused and len(running) < self._limit():
+                        item = self._next_task(tasks)
+                        if item is None:
+                            break
+                        running[asyncio.ensure_future(self._async_timed_task(item[1]))] = item
+                    if not running:
+                        if self._retry or self._follow or (paused and not self._exhausted):
+                            await asyncio.sleep(paused)
+                            continue
+                        return
+                    done, _ = await asyncio.wait(running, timeout=paused or None, return_when=asyncio.FIRST_COMPLETED)
+                    stop = False
+                    for future in done:
+                        item = running.pop(future)
+                        result, elapsed = future.result()
+                        stop = self._done(item, result, elapsed) or stop
+                    if stop:
+                        for future, item in list(running.items()):
+                            self._collect((await future)[0], item[0])
+                            running.pop(future)
+                        return
+        finally:
+            for future in running:
+                future.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+
+class ConcurrencyController:
+    """自适应并发控制类, 延迟平稳时加性增长, 触发限频或延迟突增时乘性降低"""
+    def __init__(self, max_limit: int, min_limit=1, cooldown=30,
+                 spike_ratio=2.0, max_throttles=5, sample_interval=5):
+        """
+        :param max_limit: int 并发上限
+        :param min_limit: int 并发下限, 也是初始并发
+        :param cooldown: float 触发限频后暂停请求的时间（秒）
+        :param spike_ratio: float 延迟超过基线的倍数视为延迟突增
+        :param max_throttles: int 连续触发限频的次数上限, 超过后放弃
+        :param sample_interval: float 记录并发与吞吐的间隔（秒）
+        """
+        self.max_limit = max(max_limit, min_limit)
+        self.min_limit = min_limit
+        self.cooldown = cooldown
+        self.spike_ratio = spike_ratio
+        self.max_throttles = max_throttles
+        self.sample_interval = sample_interval
+        self.window = float(min_limit)
+        self.baseline = None
+        self.throttles = 0
+        self.cooldown_until = 0
+        self.hold_until = 0
+        self.started = time.monotonic()
+        self.sample_start = self.started
+        self.sample_count = 0
+        self.timeline = []
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_limit, min(self.max_limit, int(self.window)))
+
+    def cooldown_remaining(self) -> float:
+        """限频冷却剩余秒数"""
+        return max(0, self.cooldown_until - time.monotonic())
+
+    def _decrease(self):
+        self.window = max(float(self.min_limit), self.window / 2)
+        self.hold_until = time.monotonic() + self.sample_interval
+
+    def on_success(self, latency: float):
+        """记录一次成功请求的延迟"""
+        now = time.monotonic()
+        self.throttles = 0
+        self.sample_count += 1
+        if self.baseline is None:
+            self.baseline = latency
+        if latency > self.baseline * self.spike_ratio:
+            if now >= self.hold_until:
+                self._decrease()
+        else:
+            self.baseline += (latency - self.baseline) * (0.5 if latency < self.baseline else 0.05)
+            if now >= self.hold_until:
+                self.window = min(float(self.max_limit), self.window + 1 / self.window)
+        if now - self.sample_start >= self.sample_interval:
+            self.sample(now)
+
+    def on_throttle(self) -> bool:
+        """记录一次412限频, 返回是否继续"""
+        if self.cooldown_remaining() > 0:
+            return True
+        self.throttles += 1
+        self._decrease()
+        self.cooldown_until = time.monotonic() + self.cooldown
+        self.hold_until = self.cooldown_until + self.sample_interval
+        return self.throttles <= self.max_throttles
+
+    def sample(self, now: float):
+        """记录当前时段的并发与吞吐"""
+        elapsed = now - self.sample_start
+        self.timeline.append((self.sample_start - self.started, self.limit, self.sample_count / elapsed if elapsed else 0))
+        self.sample_start = now
+        self.sample_count = 0
+
+    def postfix(self) -> str:
+        """进度条附加信息"""
+        throughput = self.timeline[-1][2] if self.timeline else 0
+        return f"并发={self.limit}, 吞吐={throughput:.1f}/s"
+
+    def report(self, title: str, unit: str):
+        """输出并发与吞吐记录"""
+        self.sample(time.monotonic())
+        lines = [f"{Fore.CYAN}[{title}]自适应并发记录:{Fore.RESET}"]
+        for offset, limit, throughput in self.timeline:
+            lines.append(f"  {offset:7.1f}秒 | 并发 {limit:3d} | 吞吐 {throughput:.1f}{unit}/秒")
+        tqdm.write("\n".join(lines))
+
+class SingleFlight:
+    """合并类, 同一键同时只执行一次请求, 其余调用等待并共享结果, 成功的结果在本次运行内按键缓存
+    键的第一项为接口名, 用于统计合并次数"""
+    def __init__(self, telemetry: "Telemetry", memo=True):
+        self.telemetry = telemetry
+        self.memo = memo
+        self.shared = 0
+        self._results = {}
+        self._calls = {}
+        self._futures = {}
+        self._lock = Lock()
+
+    def _share(self, key):
+        self.shared += 1
+        self.telemetry.record_coalesced(key[0])
+
+    def do(self, key: tuple, fn):
+        """执行 fn 或复用相同键的结果, 结果为 None(如触发限频或请求失败)时不缓存, 等待中的调用也得到 None"""
+        with self._lock:
+            if key in self._results:
+                self._share(key)
+                return self._results[key]
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = [Event(), None]
+        if not leader:
+            # 首个调用失败或触发限频时同样返回None, 不再重复请求, 由任务的重试机制处理
+            call[0].wait()
+            if call[1] is not None:
                 with self._lock:
-                    if result is not None:
-                        if self.is_dict:
-                            self.results[result[0]] = result[1]
-                        else:
-                            self.results.append(result)
+                    self._share(key)
+            return call[1]
+        try:
+            call[1] = fn()
+            return call[1]
+        finally:
+            with self._lock:
+                del self._calls[key]
+                if self.memo and call[1] is not None:
+                    self._results[key] = call[1]
+            call[0].set()
 
-class Document:
-    """文件处理类"""
-    def __init__(self, args: argparse.Namespace):
-        self.args = args
-        self.type: str
-        self.field_ref = "A1:U1"
-        self.field_map = {
-            "comic_id": "ID",
-            "title": "漫画名",
-            "authors": "作者",
-            "info": "更新信息",
-            "is_finish": "状态",
-            "price": "收费",
-            "total": "章节数",
-            "bonus_total": "特典数",
-            "last_ep_title": "最新章节标题",
-            "last_ep_date": "最新章节更新日期",
-            "last_modify_ep_title": "最后修改章节标题",
-            "last_modify_ep_date": "最后修改章节更新日期",
-            "last_bonus_title": "最新特典标题",
-            "last_bonus_date": "最新特典日期",
-            "recently_lock_bonus_title": "最近下架特典标题",
-            "recently_lock_bonus_date": "最近下架特典日期",
-            "renewal_time": "更新规则",
-            "introduction": "简介",
-            "styles": "风格",
-            "tags": "标签",
-            "horizontal_covers": "横版封面",
-            "vertical_cover": "竖版封面",
-            "square_cover": "方形封面",
-            "release_time": "上架时间",
-        }
-        self.field_map_classify = {
-            "comic_id": "ID",
-            "title": "漫画名",
-            "authors": "作者",
-            "info": "更新信息",
-            "is_finish": "状态",
-            "total": "章节数",
-            "introduction": "简介",
+    async def async_do(self, key: tuple, fn):
+        """异步执行 fn 返回的协程或复用相同键的结果"""
+        import asyncio
+        with self._lock:
+            if key in self._results:
+                self._share(key)
+                return self._results[key]
+            future = self._futures.get(key)
+            leader = future is None
+            if leader:
+                future = self._futures[key] = asyncio.get_running_loop().create_future()
+        if not leader:
+            result = await asyncio.shield(future)
+            if result is not None:
+                with self._lock:
+                    self._share(key)
+            return result
+        result = None
+        try:
+            result = await fn()
+            return result
+        finally:
+            with self._lock:
+                del self._futures[key]
+                if self.memo and result is not None:
+                    self._results[key] = result
+            future.set_result(result)
+
+    def clear(self):
+        """清空已缓存的结果, 常驻模式每次轮询前调用"""
+        with self._lock:
+            self._results.clear()
+
+class Journal:
+    """断点日志类, 追加写入已完成任务的结果"""
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._lock = Lock()
+
+    def load(self, stage: str) -> dict:
+        """读取某阶段已完成任务的结果"""
+        finished = {}
+        if not os.path.exists(self.path):
+            return finished
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record.get("stage") == stage:
+                    finished[record["key"]] = record["result"]
+        return finished
+
+    def append(self, stage: str, key, result):
+        """追加一条已完成任务的结果"""
+        line = json.dumps({"stage": stage, "key": key, "result": result}, ensure_ascii=False, default=dict)
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a+', encoding='utf-8')
+                if self._file.tell() > 0:
+                    self._file.seek(self._file.tell() - 1)
+                    if self._file.read(1) != "\n":
+                        self._file.write("\n")
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        """关闭日志文件"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def remove(self):
+        """任务全部完成后删除日志"""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+class ResponseCache:
+    """本地响应缓存类, 以接口与请求参数寻址, 按接口设置有效期, 超出容量时淘汰最久未使用的响应"""
+    default_ttl = {
+        "AllLabel": 7 * 24 * 3600,
+        "ranking": 3600,
+        "ClassPage": 3600,
+        "GetDailyPush": 3600,
+        "ComicDetail": 6 * 3600,
+        "GetComicAlbumPlus": 6 * 3600,
+    }
+
+    def __init__(self, path: str=None, max_size=512, ttl: dict=None, compress=False):
+        """
+        :param path: str 缓存目录, 为空时不启用缓存
+        :param max_size: int 缓存容量上限（MB）
+        :param ttl: dict 按接口覆盖的有效期（秒）, 为0时不缓存该接口
+        :param compress: bool 是否压缩缓存内容
+        """
+        self.path = path
+        self.max_bytes = max_size * 1024 * 1024
+        self.ttl = self.default_ttl | (ttl or {})
+        self.compress = compress
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+        self.index = {}
+        self._lock = Lock()
+        if path:
+            os.makedirs(path, exist_ok=True)
+            for entry in os.scandir(path):
+                if entry.is_file() and not entry.name.endswith(".tmp"):
+                    stat = entry.stat()
+                    self.index[entry.path] = [stat.st_size, stat.st_atime]
+                    self.size += stat.st_size
+
+    def _locate(self, method: str, url: str, data) -> tuple:
+        """返回接口名与缓存文件路径"""
+        endpoint = RateLimiter.endpoint(url)
+        payload = json.dumps([method, url, sorted((data or {}).items())], ensure_ascii=False, default=str)
+        digest = hashlib.sha256(payload.encode()).hexdigest()
+        return endpoint, os.path.join(self.path, f"{endpoint}-{digest}")
+
+    def get(self, method: str, url: str, data=None) -> requests.Response:
+        """读取未过期的缓存响应"""
+        if not self.path:
+            return None
+        endpoint, path = self._locate(method, url, data)
+        ttl = self.ttl.get(endpoint, self.ttl.get("*", 0))
+        if ttl <= 0:
+            return None
+        try:
+            stat = os.stat(path)
+            if time.time() - stat.st_mtime > ttl:
+                with self._lock:
+                    self.misses += 1
+                return None
+            with open(path, 'rb') as f:
+                content = f.read()
+            now = time.time()
+            os.utime(path, (now, stat.st_mtime))
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+            if path in self.index:
+                self.index[path][1] = now
+        if content[:1] == b"Z":
+            content = zlib.decompress(content[1:])
+        else:
+            content = content[1:]
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response.encoding = "utf-8"
+        response._content = content
+        return response
+
+    def put(self, method: str, url: str, data, response: requests.Response):
+        """写入成功的响应"""
+        if not self.path or response.status_code != 200:
+            return
+        endpoint, path = self._locate(method, url, data)
+        if self.ttl.get(endpoint, self.ttl.get("*", 0)) <= 0:
+            return
+        content = b"Z" + zlib.compress(response.content) if self.compress else b"R" + response.content
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+        with self._lock:
+            previous = self.index.get(path)
+            if previous:
+                self.size -= previous[0]
+            self.index[path] = [len(content), time.time()]
+            self.size += len(content)
+            if self.size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """淘汰最久未使用的响应, 直至低于容量上限的90%"""
+        for path, (size, _) in sorted(self.index.items(), key=lambda x: x[1][1]):
+            if self.size <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            del self.index[path]
+            self.size -= size
+
+    def stats(self) -> str:
+        """缓存统计"""
+        return f"缓存统计: 命中{self.hits}次, 未命中{self.misses}次, 占用{self.size / 1024 / 1024:.1f}MB"
+
+class Telemetry:
+    """请求统计类, 按接口记录请求数、状态码、延迟分布、流量、限速等待, 按阶段记录重试、限频与耗时"""
+    buckets = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self):
+        self.started = time.time()
+        self.endpoints = {}
+        self.stages = {}
+        self.exports = {}
+        self._lock = Lock()
+        self._stopped = None
+
+    def _endpoint(self, endpoint: str) -> dict:
+        if endpoint not in self.endpoints:
+            self.endpoints[endpoint] = {
+                "requests": 0, "status": {}, "errors": 0, "bytes": 0, "cache_hits": 0, "coalesced": 0, "rate_limit_wait": 0.0,
+                "latency_sum": 0.0, "latency_buckets": [0] * (len(self.buckets) + 1),
+            }
+        return self.endpoints[endpoint]
+
+    def _stage(self, stage: str) -> dict:
+        if stage not in self.stages:
+            self.stages[stage] = {"tasks": 0, "duration": 0.0, "retries": 0, "failures": 0, "throttles": 0}
+        return self.stages[stage]
+
+    def record_request(self, endpoint: str, status: int, elapsed: float, size: int):
+        with self._lock:
+            stats = self._endpoint(endpoint)
+            stats["requests"] += 1
+            stats["status"][str(status)] = stats["status"].get(str(status), 0) + 1
+            stats["bytes"] += size
+            stats["latency_sum"] += elapsed
+            index = next((i for i, bound in enumerate(self.buckets) if elapsed <= bound), len(self.buckets))
+            stats["latency_buckets"][index] += 1
+
+    def record_error(self, endpoint: str):
+        with self._lock:
+            self._endpoint(endpoint)["errors"] += 1
+
+    def record_cache_hit(self, endpoint: str):
+        with self._lock:
+            self._endpoint(endpoint)["cache_hits"] += 1
+
+    def record_coalesced(self, endpoint: str):
+        with self._lock:
+            self._endpoint(endpoint)["coalesced"] += 1
+
+    def record_wait(self, endpoint: str, seconds: float):
+        if seconds:
+            with self._lock:
+                self._endpoint(endpoint)["rate_limit_wait"] += seconds
+
+    def record_task_error(self, stage: str, retry: bool):
+        with self._lock:
+            self._stage(stage)["retries" if retry else "failures"] += 1
+
+    def record_throttle(self, stage: str):
+        with self._lock:
+            self._stage(stage)["throttles"] += 1
+
+    def record_stage(self, stage: str, elapsed: float, tasks: int):
+        with self._lock:
+            stats = self._stage(stage)
+            stats["duration"] += elapsed
+            stats["tasks"] += tasks
+
+    def record_export(self, kind: str, elapsed: float, records: int):
+        with self._lock:
+            self.exports[kind] = {"duration": elapsed, "records": records}
+
+    def snapshot(self) -> dict:
+        """当前统计的副本"""
+        with self._lock:
+            return json.loads(json.dumps({
+                "started": self.started,
+                "elapsed": time.time() - self.started,
+                "latency_buckets": list(self.buckets),
+                "endpoints": self.endpoints,
+                "stages": self.stages,
+                "exports": self.exports,
+            }))
+
+    def prometheus(self, data: dict) -> str:
+        """转换为Prometheus文本格式"""
+        def label(value) -> str:
+            return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+        lines = []
+
+        def metric(name: str, kind: str, help_text: str, samples: list):
+            lines.append(f"# HELP bmmc_{name} {help_text}")
+            lines.append(f"# TYPE bmmc_{name} {kind}")
+            for labels, value, suffix in samples:
+                text = ",".join(f'{k}="{label(v)}"' for k, v in labels.items())
+                lines.append(f"bmmc_{name}{suffix}{{{text}}} {value}" if text else f"bmmc_{name}{suffix} {value}")
+
+        endpoints = data["endpoints"]
+        metric("requests_total", "counter", "Requests sent per endpoint and status code.",
+               [({"endpoint": e, "code": c}, n, "") for e, s in endpoints.items() for c, n in s["status"].items()])
+        histogram = []
+        for endpoint, stats in endpoints.items():
+            cumulative = 0
+            for bound, n in zip(list(self.buckets) + ["+Inf"], stats["latency_buckets"]):
+                cumulative += n
+                histogram.append(({"endpoint": endpoint, "le": bound}, cumulative, "_bucket"))
+            histogram.append(({"endpoint": endpoint}, stats["latency_sum"], "_sum"))
+            histogram.append(({"endpoint": endpoint}, stats["requests"], "_count"))
+        metric("request_duration_seconds", "histogram", "Request latency per endpoint.", histogram)
+        for name, key, help_text in (
+            ("response_bytes_total", "bytes", "Response body bytes per endpoint."),
+            ("request_errors_total", "errors", "Requests failed without a response per endpoint."),
+            ("cache_hits_total", "cache_hits", "Responses served from the local cache per endpoint."),
+            ("coalesced_total", "coalesced", "Duplicate calls that reused an in-flight or earlier result per endpoint."),
+            ("rate_limit_wait_seconds_total", "rate_limit_wait", "Time spent waiting for the rate limiter per endpoint."),
+        ):
+            metric(name, "counter", help_text, [({"endpoint": e}, s[key], "") for e, s in endpoints.items()])
+        for name, key, kind, help_text in (
+            ("stage_tasks_total", "tasks", "counter", "Tasks completed per stage."),
+            ("stage_duration_seconds", "duration", "gauge", "Wall time per stage."),
+            ("task_retries_total", "retries", "counter", "Task retries per stage."),
+            ("task_failures_total", "failures", "counter", "Tasks failed after all retries per stage."),
+            ("throttles_total", "throttles", "counter", "Tasks that ended on a 412 throttle per stage."),
+        ):
+            metric(name, kind, help_text, [({"stage": st}, s[key], "") for st, s in data["stages"].items()])
+        metric("export_duration_seconds", "gauge", "Output writing time per format.",
+               [({"format": f}, s["duration"], "") for f, s in data["exports"].items()])
+        metric("export_records", "gauge", "Records written per format.",
+               [({"format": f}, s["records"], "") for f, s in data["exports"].items()])
+        metric("run_elapsed_seconds", "gauge", "Seconds since the run started.", [({}, data["elapsed"], "")])
+        metric("last_write_timestamp_seconds", "gauge", "Unix time of this metrics file.", [({}, time.time(), "")])
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        """原子写入 path.json 与 path.prom"""
+        data = self.snapshot()
+        for ext, text in ((".json", json.dumps(data, ensure_ascii=False, indent=4)), (".prom", self.prometheus(data))):
+            try:
+                with open(f"{path}{ext}.tmp", "w", encoding="utf-8") as f:
+                    f.write(text)
+                os.replace(f"{path}{ext}.tmp", f"{path}{ext}")
+            except OSError as e:
+                tqdm.write(f"{Fore.YELLOW}请求统计写入失败: {e}{Fore.RESET}")
+
+    def start(self, path: str, interval: float):
+        """后台定期写入"""
+        self._stopped = Event()
+
+        def loop():
+            while not self._stopped.wait(interval):
+                self.write(path)
+
+        Thread(target=loop, daemon=True).start()
+
+    def stop(self):
+        if self._stopped is not None:
+            self._stopped.set()
+
+class Profiler:
+    """性能分析类, 记录各阶段耗时跨度与内存峰值, 输出cProfile的pstats文件或Chrome trace"""
+    def __init__(self, path: str = None, memory=False):
+        self.path = path
+        self.memory = memory
+        self.enabled = bool(path or memory)
+        self.trace = bool(path) and path.lower().endswith(".json")
+        self.cprofile = bool(path) and not self.trace
+        self.spans = []
+        self.events = []
+        self.totals = {}
+        self._origin = time.perf_counter()
+        self._lock = Lock()
+        self._profile = None
+        self._started = False
+        self._ids = count()
+
+    def _timestamp(self, moment: float) -> float:
+        """相对开始时间的微秒数"""
+        return (moment - self._origin) * 1e6
+
+    def start(self):
+        """开始分析, cProfile基于sys.monitoring, 同时覆盖工作线程"""
+        if not self.enabled or self._started:
+            return
+        self._started = True
+        if self.memory:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+        if self.cprofile:
+            import cProfile
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    @contextmanager
+    def span(self, name: str):
+        """记录一个阶段的耗时, 开启内存分析时同时记录该阶段的内存峰值"""
+        if not self.enabled:
+            yield
+            return
+        if self.memory:
+            import tracemalloc
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            info = {}
+            if self.memory:
+                current, peak = tracemalloc.get_traced_memory()
+                info = {"current_mb": round(current / 1048576, 2), "peak_mb": round(peak / 1048576, 2)}
+            with self._lock:
+                self.spans.append((name, elapsed, info))
+                self.events.append({"name": name, "cat": "stage", "ph": "X", "ts": self._timestamp(start),
+                                    "dur": elapsed * 1e6, "pid": os.getpid(), "tid": threading.get_ident(), "args": info})
+
+    @contextmanager
+    def task(self, stage: str, asynchronous=False):
+        """Chrome trace模式下记录单个任务的跨度, 并发任务按线程分行, 异步任务记录为异步事件"""
+        if not self.trace:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            event = {"name": stage, "cat": "task", "pid": os.getpid(), "tid": threading.get_ident()}
+            with self._lock:
+                if asynchronous:
+                    index = next(self._ids)
+                    self.events.append(event | {"ph": "b", "id": index, "ts": self._timestamp(start)})
+                    self.events.append(event | {"ph": "e", "id": index, "ts": self._timestamp(end)})
+                else:
+                    self.events.append(event | {"ph": "X", "ts": self._timestamp(start), "dur": (end - start) * 1e6})
+
+    def add(self, name: str, elapsed: float, calls: int):
+        """累计记录分散在各处的耗时, 如逐条写入输出文件"""
+        if self.enabled:
+            with self._lock:
+                total, count_ = self.totals.get(name, (0.0, 0))
+                self.totals[name] = (total + elapsed, count_ + calls)
+
+    def report(self) -> str:
+        """各阶段耗时汇总"""
+        lines = ["阶段耗时分析:"]
+        for name, elapsed, info in self.spans:
+            memory = f", 内存峰值{info['peak_mb']}MB" if info else ""
+            lines.append(f"  {name:<12} {elapsed:>9.3f}秒{memory}")
+        for name, (elapsed, calls) in self.totals.items():
+            lines.append(f"  {name:<12} {elapsed:>9.3f}秒(累计{calls}次)")
+        return "\n".join(lines)
+
+    def stop(self):
+        """停止分析并输出结果"""
+        if not self.enabled or not self._started:
+            return
+        self._started = False
+        if self.cprofile:
+            self._profile.disable()
+        if self.memory:
+            import tracemalloc
+            tracemalloc.stop()
+        tqdm.write(f"{Fore.CYAN}{self.report()}{Fore.RESET}")
+        if not self.path:
+            return
+        try:
+            if self.trace:
+                with open(self.path, "w", encoding="utf-8") as f:
+                    json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+            else:
+                import pstats
+                pstats.Stats(self._profile).dump_stats(self.path)
+        except OSError as e:
+            raise RuntimeError(f"分析结果保存失败！ {e}") from e
+        tqdm.write(f"{Fore.CYAN}分析结果已保存到{self.path}{Fore.RESET}")
+
+class TokenBucket:
+    """令牌桶"""
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self._lock = Lock()
+
+    def reserve(self) -> float:
+        """预定一个令牌, 返回需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0
+            return -self.tokens / self.rate
+
+class RateLimiter:
+    """按接口限速类, 多线程与协程共享"""
+    def __init__(self, rates: dict=None, burst=1):
+        """
+        :param rates: dict 接口名到每秒请求数的映射, "*" 为其余接口的默认值
+        :param burst: int 令牌桶容量
+        """
+        self.rates = rates or {}
+        self.burst = burst
+        self.buckets = {}
+        self._lock = Lock()
+
+    @staticmethod
+    def endpoint(url: str) -> str:
+        """从地址中解析接口名"""
+        path = urlparse(url).path
+        if path.endswith("index.pageContext.json"):
+            return "ranking"
+        return path.rsplit("/", 1)[-1]
+
+    def reserve(self, url: str) -> float:
+        """为接口预定一次请求, 返回需要等待的秒数"""
+        if not self.rates:
+            return 0
+        endpoint = self.endpoint(url)
+        if endpoint not in self.buckets:
+            with self._lock:
+                if endpoint not in self.buckets:
+                    rate = self.rates.get(endpoint, self.rates.get("*"))
+                    self.buckets[endpoint] = TokenBucket(rate, self.burst) if rate else None
+        bucket = self.buckets[endpoint]
+        if bucket is None:
+            return 0
+        return bucket.reserve()
+
+    def wait(self, url: str) -> float:
+        """阻塞等待至可以请求, 返回等待的秒数"""
+        delay = self.reserve(url)
+        if delay > 0:
+            time.sleep(delay)
+        return max(delay, 0)
+
+    async def async_wait(self, url: str) -> float:
+        """异步等待至可以请求, 返回等待的秒数"""
+        import asyncio
+        delay = self.reserve(url)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return max(delay, 0)
+
+class AsyncClient:
+    """异步请求类"""
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.loop = None
+        self.session = None
+
+    def run(self, coro):
+        """在常驻事件循环中执行协程"""
+        import asyncio
+        if self.loop is None:
+            self.loop = asyncio.new_event_loop()
+        return self.loop.run_until_complete(coro)
+
+    def new_session(self):
+        """创建复用连接的异步会话"""
+        try:
+            import aiohttp
+        except ImportError as e:
+            raise RuntimeError(f"{Fore.RED}异步引擎需要安装aiohttp: pip install aiohttp{Fore.RESET}") from e
+        pool_size = self.args.workers if self.args.pool_size is None else self.args.pool_size
+        connector = aiohttp.TCPConnector(limit=max(pool_size, 1), ssl=False, force_close=pool_size <= 0)
+        return aiohttp.ClientSession(connector=connector)
+
+    async def request(self, method: str, url: str, headers=None, data=None, timeout=5) -> requests.Response:
+        """发送请求, 返回与requests一致的响应对象"""
+        import aiohttp
+        if self.session is None:
+            self.session = self.new_session()
+        try:
+            async with self.session.request(method, url, headers=headers, data=data,
+                                            timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+                content = await resp.read()
+        except (aiohttp.ClientError, TimeoutError) as e:
+            raise requests.ConnectionError(e) from e
+        response = requests.Response()
+        response.status_code = resp.status
+        response.reason = resp.reason
+        response.url = str(resp.url)
+        response.headers = CaseInsensitiveDict(resp.headers)
+        response.encoding = "utf-8"
+        response._content = content
+        return response
+
+    def close(self):
+        """关闭会话与事件循环"""
+        if self.loop is None:
+            return
+        if self.session is not None:
+            self.loop.run_until_complete(self.session.close())
+        self.loop.close()
+
+class ResponseDecoder:
+    """响应解码类, 可选orjson或msgspec后端, msgspec后端只解码输出所需的字段"""
+    def __init__(self, backend="json", episode_fields=()):
+        self.backend = backend
+        self.episode_fields = episode_fields
+        self._loads = None
+        self._types = None
+
+    def _import_msgspec(self):
+        try:
+            import msgspec
+        except ImportError as e:
+            raise RuntimeError(f"{Fore.RED}msgspec解码需要安装msgspec: pip install msgspec{Fore.RESET}") from e
+        return msgspec
+
+    def _decode(self, decode, content: bytes):
+        """统一解码异常为json.JSONDecodeError"""
+        msgspec = self._import_msgspec()
+        try:
+            return decode(content)
+        except msgspec.DecodeError as e:
+            raise json.JSONDecodeError(str(e), "", 0) from e
+
+    def loads(self, content: bytes):
+        """完整解码json"""
+        if self._loads is None:
+            if self.backend == "orjson":
+                try:
+                    import orjson
+                except ImportError as e:
+                    raise RuntimeError(f"{Fore.RED}orjson解码需要安装orjson: pip install orjson{Fore.RESET}") from e
+                self._loads = orjson.loads
+            elif self.backend == "msgspec":
+                decoder = self._import_msgspec().json.Decoder()
+                self._loads = lambda content: self._decode(decoder.decode, content)
+            else:
+                self._loads = json.loads
+        return self._loads(content)
+
+    def projected_types(self) -> dict:
+        """按需定义msgspec结构体, 未声明的字段在解码时直接跳过"""
+        if self._types is None:
+            msgspec = self._import_msgspec()
+
+            class Projection(msgspec.Struct):
+                def __getitem__(self, key):
+                    return getattr(self, key)
+
+                def keys(self):
+                    return self.__struct_fields__
+
+                def get(self, key, default=None):
+                    return getattr(self, key, default)
+
+            def struct(name, fields):
+                return msgspec.defstruct(name, fields, bases=(Projection,))
+
+            episode_fields = dict.fromkeys(("id", "short_title", "title", "pub_time", "index_last_modified") + tuple(self.episode_fields))
+            episode = struct("Episode", [(name, object, "") for name in episode_fields])
+            comic = struct("ComicDetail", [(name, object, msgspec.UNSET) for name in ComicRecord.fields + ("id", "pay_mode")] + [("ep_list", list[episode], [])])
+            item = struct("BonusItem", [(name, object, "") for name in ("id", "title", "online_time", "offline_time")])
+            album = struct("ComicAlbum", [("list", list[struct("BonusEntry", [("item", item)])], [])])
+            self._types = {
+                "comic": msgspec.json.Decoder(struct("ComicDetailResponse", [("data", comic | None, None)])),
+                "bonus": msgspec.json.Decoder(struct("ComicAlbumResponse", [("data", album | None, None)])),
+            }
+        return self._types
+
+    def comic_details(self, content: bytes, project=True) -> dict:
+        """解码漫画详情"""
+        if not project or self.backend != "msgspec":
+            return self.loads(content).get("data", {})
+        data = self._decode(self.projected_types()["comic"].decode, content).data
+        if data is None:
+            return {}
+        unset = self._import_msgspec().UNSET
+        return {name: getattr(data, name) for name in data.__struct_fields__ if getattr(data, name) is not unset}
+
+    def comic_bonus(self, content: bytes, project=True) -> list:
+        """解码漫画特典列表"""
+        if not project or self.backend != "msgspec":
+            return self.loads(content).get("data", {}).get("list", {})
+        data = self._decode(self.projected_types()["bonus"].decode, content).data
+        return [] if data is None else data.list
+
+class BonusIndex:
+    """跨漫画的特典下架时间索引, 以最小堆保存所有尚未下架的特典"""
+    def __init__(self):
+        self._heap = []
+        self._seen = set()
+        self._titles = {}
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def add(self, comic_id, items: list):
+        """登记一本漫画尚未下架的特典, 重复请求的特典只保留一份"""
+        with self._lock:
+            for item in items:
+                key = (str(comic_id), item["id"])
+                if key in self._seen:
+                    continue
+                self._seen.add(key)
+                heapq.heappush(self._heap, (item["offline_time"], str(comic_id), item["id"], item["title"]))
+
+    def name(self, comic_id, title: str):
+        """记录漫画标题, 用于展示"""
+        if title:
+            self._titles[str(comic_id)] = title
+
+    def expiring(self, days: float, now: datetime = None) -> list:
+        """按下架时间顺序返回未来days天内下架的特典, 只弹出窗口内的元素而不遍历整个索引"""
+        now = now or datetime.now()
+        start, end = now.strftime("%Y-%m-%d %H:%M:%S"), (now + timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+        result = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= start:
+                heapq.heappop(self._heap)
+            # 沿堆的父子关系按序访问, 子节点不早于父节点, 超出窗口的分支无需展开
+            frontier = [(self._heap[0], 0)] if self._heap else []
+            while frontier and frontier[0][0][0] <= end:
+                (offline_time, comic_id, bonus_id, title), index = heapq.heappop(frontier)
+                result.append({"comic_id": comic_id, "comic_title": self._titles.get(comic_id, ""), "bonus_id": bonus_id,
+                               "title": title, "offline_time": offline_time})
+                for child in (2 * index + 1, 2 * index + 2):
+                    if child < len(self._heap):
+                        heapq.heappush(frontier, (self._heap[child], child))
+        return result
+
+class ComicRecord(MutableMapping):
+    """精简的漫画数据, 固定字段存放在槽位中, 其余字段仅在需要时保存在extras"""
+    fields = (
+        "comic_id", "title", "authors", "author_name", "info", "is_finish", "price", "total",
+        "last_ep_id", "last_ep_title", "last_ep_date",
+        "last_modify_ep_id", "last_modify_ep_title", "last_modify_ep_date",
+        "bonus_total", "last_bonus_title", "last_bonus_date",
+        "recently_lock_bonus_title", "recently_lock_bonus_date",
+        "renewal_time", "introduction", "styles", "tags",
+        "horizontal_cover", "horizontal_covers", "vertical_cover", "square_cover", "release_time", "bonus",
+    )
+    __slots__ = fields + ("extras",)
+    excludes = {"ep_list", "styles2", "fav_comic_info", "series_info", "story_elems",
+                "discount_marketing", "data_info", "coupon_marketing", "discount_banner"}
+    _field_set = frozenset(fields)
+
+    def __init__(self, data: dict=None, keep_extras=False):
+        self.extras = {} if keep_extras else None
+        if data:
+            self.update(data)
+
+    def __getitem__(self, key):
+        if key in self._field_set:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self.extras is None:
+            raise KeyError(key)
+        return self.extras[key]
+
+    def __setitem__(self, key, value):
+        if key in self._field_set:
+            setattr(self, key, value)
+        elif self.extras is not None and key not in self.excludes:
+            self.extras[key] = value
+
+    def __delitem__(self, key):
+        if key in self._field_set:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self.extras is not None:
+            del self.extras[key]
+        else:
+            raise KeyError(key)
+
+    def __iter__(self):
+        for key in self.fields:
+            if hasattr(self, key):
+                yield key
+        if self.extras:
+            yield from self.extras
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"ComicRecord({dict(self)!r})"
+
+class Document:
+    """文件处理类"""
+    sqlite_exts = (".sqlite", ".sqlite3", ".db")
+    columnar_exts = (".parquet", ".arrow", ".feather")
+    name = ""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.type: str
+        self.output = args.output
+        self.field_ref = "A1:U1"
+        self.sqlite_writer = SqliteWriter
+        self.field_map = {
+            "comic_id": "ID",
+            "title": "漫画名",
+            "authors": "作者",
+            "info": "更新信息",
+            "is_finish": "状态",
+            "price": "收费",
+            "total": "章节数",
+            "bonus_total": "特典数",
+            "last_ep_title": "最新章节标题",
+            "last_ep_date": "最新章节更新日期",
+            "last_modify_ep_title": "最后修改章节标题",
+            "last_modify_ep_date": "最后修改章节更新日期",
+            "last_bonus_title": "最新特典标题",
+            "last_bonus_date": "最新特典日期",
+            "recently_lock_bonus_title": "最近下架特典标题",
+            "recently_lock_bonus_date": "最近下架特典日期",
+            "renewal_time": "更新规则",
+            "introduction": "简介",
+            "styles": "风格",
+            "tags": "标签",
+            "horizontal_covers": "横版封面",
+            "vertical_cover": "竖版封面",
+            "square_cover": "方形封面",
+            "release_time": "上架时间",
+        }
+        self.field_map_classify = {
+            "comic_id": "ID",
+            "title": "漫画名",
+            "authors": "作者",
+            "info": "更新信息",
+            "is_finish": "状态",
+            "total": "章节数",
+            "introduction": "简介",
             "styles": "风格",
             "rd_tag": "标签",
             "horizontal_covers": "横版封面",
@@ -844,72 +2491,158 @@ class Document:
             self.field_map = self.field_map_buy
             self.field_ref = "A1:I1"
 
-    def load(self) -> list:
+    def load(self, path: str=None) -> list:
         """载入数据"""
-        data: str
-        ext = os.path.splitext(self.args.input)[-1].lower()
-        field_dict = {v: k for k, v in self.field_map.items()}
+        return list(self.iter_load(path))
+
+    def iter_load(self, path: str=None, skip=None, on_skip=None):
+        """逐条读取数据, skip为真的行直接交给on_skip而不再向后传递"""
+        path = path or self.args.input
+        ext = os.path.splitext(path)[-1].lower()
         if ext == '.json':
-            with open(self.args.input, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            rows = self.iter_json_array(path)
+        elif ext == '.jsonl':
+            rows = self.iter_jsonl(path)
         elif ext == '.csv':
-            data = []
-            with open(self.args.input, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                field_mapping = {v: k for k, v in self.field_map.items()}
-                data = []
-                for row in reader:
-                    new_row = {}
-                    for ch_key, value in row.items():
-                        eng_key = field_mapping.get(ch_key, ch_key)
-                        new_row[eng_key] = "" if value is None else value
-                    data.append(new_row)
+            rows = self.iter_csv(path)
         elif ext == '.xlsx':
-            wb = load_workbook(self.args.input)
-            ws = wb.active
-            
-            headers_zh = [cell.value for cell in ws[1]]
-            headers = [field_dict.get(h, h) for h in headers_zh]
-            data = []
-            for row in ws.iter_rows(min_row=2, values_only=True):
-                row_dict = dict(zip(headers, ["" if cell is None else cell for cell in row]))
-                data.append(row_dict)
+            rows = self.iter_xlsx(path)
+        elif ext in self.sqlite_exts:
+            rows = self.iter_sqlite(path)
+        elif ext in self.columnar_exts:
+            rows = self.iter_columnar(path)
         else:
-            raise ValueError(f"{Fore.RED}仅支持json、csv、xlsx格式的导入读取{Fore.RESET}")
-        return data
-        
+            raise ValueError(f"{Fore.RED}仅支持json、jsonl、csv、xlsx、sqlite、parquet、arrow格式的导入读取{Fore.RESET}")
+        for row in rows:
+            if skip and skip(row):
+                if on_skip:
+                    on_skip(row)
+                continue
+            yield row
+
+    def iter_json_array(self, path: str, chunk_size=1 << 16):
+        """分块解析json数组, 每解析出一个元素立即返回"""
+        decoder = json.JSONDecoder()
+        with open(path, 'r', encoding='utf-8') as f:
+            buffer = f.read(chunk_size).lstrip()
+            if not buffer.startswith("["):
+                raise json.JSONDecodeError("输入文件不是json数组", buffer, 0)
+            buffer = buffer[1:]
+            eof = False
+            while True:
+                buffer = buffer.lstrip()
+                if buffer.startswith(","):
+                    buffer = buffer[1:].lstrip()
+                if buffer.startswith("]"):
+                    return
+                try:
+                    if not buffer:
+                        raise json.JSONDecodeError("数据不完整", buffer, 0)
+                    item, end = decoder.raw_decode(buffer)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    chunk = f.read(chunk_size)
+                    eof = not chunk
+                    buffer += chunk
+                    continue
+                yield item
+                buffer = buffer[end:]
+
+    def iter_jsonl(self, path: str):
+        """逐行解析json lines"""
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def iter_csv(self, path: str):
+        """逐行读取csv, 中文表头转换为字段名"""
+        field_dict = {v: k for k, v in self.field_map.items()}
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            for row in csv.DictReader(f):
+                yield {field_dict.get(k, k): "" if v is None else v for k, v in row.items()}
+
+    def iter_xlsx(self, path: str):
+        """以只读模式逐行读取xlsx, 中文表头转换为字段名"""
+        from openpyxl import load_workbook
+        field_dict = {v: k for k, v in self.field_map.items()}
+        wb = load_workbook(path, read_only=True)
+        try:
+            rows = wb.active.iter_rows(values_only=True)
+            headers = [field_dict.get(h, h) for h in next(rows, ())]
+            for row in rows:
+                yield dict(zip(headers, ["" if cell is None else cell for cell in row]))
+        finally:
+            wb.close()
+
+    def iter_sqlite(self, path: str):
+        """逐行读取sqlite中的漫画表"""
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        conn = sqlite3.connect(path)
+        try:
+            cursor = conn.execute("SELECT * FROM comics ORDER BY comic_id")
+            headers = [column[0] for column in cursor.description]
+            for row in cursor:
+                yield dict(zip(headers, ["" if cell is None else cell for cell in row]))
+        except sqlite3.Error as e:
+            raise ValueError(f"sqlite文件读取失败: {e}") from e
+        finally:
+            conn.close()
+
+    def iter_columnar(self, path: str):
+        """按批读取parquet或arrow, 日期转换为字符串"""
+        pa = import_pyarrow()
+        if path.lower().endswith(".parquet"):
+            import pyarrow.parquet as pq
+            batches = pq.ParquetFile(path).iter_batches()
+        else:
+            reader = pa.ipc.open_file(pa.memory_map(path))
+            batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+        for batch in batches:
+            for row in batch.to_pylist():
+                yield {k: v.isoformat() if isinstance(v, date) else "" if v is None else v for k, v in row.items()}
+
+    def load_snapshot(self) -> list:
+        """载入上次输出的数据作为快照"""
+        if not os.path.exists(self.args.output):
+            return []
+        try:
+            return self.load(self.args.output)
+        except (ValueError, OSError) as e:
+            tqdm.write(f"{Fore.YELLOW}上次输出文件读取失败, 将请求全部漫画详情: {e}{Fore.RESET}")
+            return []
 
     def save(self, data: dict):
         """保存为文件"""
-        lower_name = self.args.output.lower()
-        if lower_name.endswith('.xlsx'):
+        with self.args.profiler.span("save"), self.writer() as writer:
+            for row in data:
+                writer.write(row)
+
+    def writer(self, enabled=True):
+        """按输出文件格式打开流式写入器, 未启用时返回空上下文"""
+        if not enabled:
+            return nullcontext()
+        lower_name = self.output.lower()
+        if lower_name.endswith(self.columnar_exts):
+            self.type = 'parquet' if lower_name.endswith('.parquet') else 'arrow'
+            return ColumnarWriter(self, self.output)
+        elif lower_name.endswith(self.sqlite_exts):
+            self.type = 'sqlite'
+            return self.sqlite_writer(self, self.output)
+        elif lower_name.endswith('.xlsx'):
             self.type = 'xlsx'
-            self.xlsx(data)
+            return XlsxWriter(self, self.output)
         elif lower_name.endswith('.csv'):
             self.type = 'csv'
-            self.csv(data)
+            return CsvWriter(self, self.output)
+        elif lower_name.endswith('.jsonl'):
+            self.type = 'jsonl'
+            return JsonlWriter(self, self.output)
         else:
             self.type = 'json'
-            self.json(data)
-
-    def json(self, data: dict):
-        """保存为json"""
-        try:
-            for item in data:
-                item.pop("ep_list", None)
-                item.pop("styles2", None)
-                item.pop("fav_comic_info", None)
-                item.pop("series_info", None)
-                item.pop("story_elems", None)
-                item.pop("discount_marketing", None)
-                item.pop("data_info", None)
-                item.pop("coupon_marketing", None)
-                item.pop("discount_banner", None)
-            json.dump(data, open(self.args.output, mode="w",encoding="utf-8"), ensure_ascii=False,indent=4)
-        except TypeError as e:
-            raise RuntimeError(f"数据异常, 保存错误！ {e}") from e
-        except PermissionError as e:
-            raise RuntimeError(f"数据保存失败, 无写入权限！ {e}") from e
+            return JsonWriter(self, self.output)
 
     def mapping_field(self, field: str, row: dict) -> dict:
         """处理输出字段"""
@@ -955,51 +2688,430 @@ class Document:
             value = "是" if value else "否"
         return str(value)
 
-    def xlsx(self, data: dict):
-        """保存为xlsx"""
+class EpisodeDocument(Document):
+    """章节数据文件处理类, 每个章节一行, 随详情响应逐条写出"""
+    name = "episodes."
+    source_fields = ("ord", "short_title", "title", "pub_time", "index_last_modified",
+                     "pay_mode", "pay_gold", "is_locked", "is_in_free", "size", "image_count")
+
+    def __init__(self, args: argparse.Namespace):
+        super().__init__(args)
+        self.output = args.episodes or ""
+        self.field_map = {
+            "comic_id": "漫画ID",
+            "ep_id": "章节ID",
+            "ord": "序号",
+            "short_title": "章节短标题",
+            "title": "章节标题",
+            "pub_time": "发布时间",
+            "index_last_modified": "最后修改时间",
+            "pay_mode": "付费模式",
+            "pay_gold": "价格",
+            "is_locked": "已锁定",
+            "is_in_free": "限免",
+            "size": "大小",
+            "image_count": "图片数",
+        }
+        self.field_ref = "A1:M1"
+        self.sqlite_writer = EpisodeSqliteWriter
+
+    @classmethod
+    def row(cls, comic_id, episode) -> dict:
+        """章节输出行"""
+        row = {"comic_id": comic_id, "ep_id": episode.get("id")}
+        for field in cls.source_fields:
+            row[field] = episode.get(field, "")
+        return row
+
+class StreamWriter:
+    """流式写入基类, 逐条写入临时文件, 完成后原子替换输出文件"""
+    def __init__(self, document: Document, path: str):
+        self.document = document
+        self.path = path
+        self.part_path = f"{path}.part"
+        self.count = 0
+        self.elapsed = 0.0
+        self._file = None
+        self._lock = Lock()
+
+    def __enter__(self):
         try:
-            field_keys = list(self.field_map.keys())
-            headers = [self.field_map[field] for field in field_keys]
-            wb = Workbook()
-            ws = wb.active
-            ws.append(headers)
-            ws.auto_filter.ref = self.field_ref
-            for col_num, cell in enumerate(ws[1], 1):
-                column_letter = get_column_letter(col_num)
-                adjusted_width = len(str(cell.value)) * 2 + 5
-                ws.column_dimensions[column_letter].width = adjusted_width
-            for row in data:
-                row_data = []
-                for field in field_keys:
-                    value = self.mapping_field(field, row)
-                    row_data.append(value)
-                ws.append(row_data)
-            for cell in ws[1]:
-                cell.alignment = Alignment(horizontal='center')
-                cell.font = Font(bold=True)
-            wb.save(self.args.output)
+            self.open()
         except PermissionError as e:
             raise RuntimeError(f"数据保存失败, 无写入权限！ {e}") from e
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.finish()
+            tqdm.write(f"{Fore.YELLOW}任务中断, 已写入的{self.count}条数据保存在{self.part_path}{Fore.RESET}")
+
+    def open(self):
+        """打开临时文件"""
+
+    def write(self, record: dict):
+        """写入一条数据"""
+        with self._lock:
+            start = time.monotonic()
+            try:
+                self.write_record(record)
+            except TypeError as e:
+                raise RuntimeError(f"数据异常, 保存错误！ {e}") from e
+            self.count += 1
+            self.elapsed += time.monotonic() - start
+
+    def write_record(self, record: dict):
+        """写入一条数据的具体实现"""
+        raise NotImplementedError
 
-    def csv(self, data: dict, encoding="utf-8-sig"):
-        """保存为csv"""
+    def finish(self):
+        """补全文件结尾并关闭临时文件"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self):
+        """完成写入, 替换输出文件"""
+        start = time.monotonic()
+        self.finish()
         try:
-            field_keys = list(self.field_map.keys())
-            headers = [self.field_map[field] for field in field_keys]
-            with open(self.args.output, mode="w", newline="", encoding=encoding) as f:
-                writer = csv.writer(f)
-                writer.writerow(headers)
-                for row in data:
-                    row_data = []
-                    for field in field_keys:
-                        value = self.mapping_field(field, row)
-                        row_data.append(value)
-                    writer.writerow(row_data)
+            os.replace(self.part_path, self.path)
         except PermissionError as e:
             raise RuntimeError(f"数据保存失败, 无写入权限！ {e}") from e
+        self.record_export(time.monotonic() - start)
+
+    def record_export(self, elapsed: float):
+        """记录写入与收尾的累计耗时"""
+        self.elapsed += elapsed
+        kind = f"{self.document.name}{self.document.type}"
+        self.document.args.telemetry.record_export(kind, self.elapsed, self.count)
+        self.document.args.profiler.add(f"write:{kind}", self.elapsed, self.count)
+
+    def row(self, record: dict) -> list:
+        """按字段映射转换一行数据"""
+        return [self.document.mapping_field(field, record) for field in self.document.field_map]
+
+class JsonWriter(StreamWriter):
+    """流式写入json数组"""
+    excludes = ComicRecord.excludes
+
+    def open(self):
+        self._file = open(self.part_path, mode="w", encoding="utf-8")
+        self._file.write("[")
+
+    def write_record(self, record: dict):
+        item = {k: v for k, v in record.items() if k not in self.excludes}
+        text = json.dumps(item, ensure_ascii=False, indent=4).replace("\n", "\n    ")
+        self._file.write(f"{"," if self.count else ""}\n    {text}")
+
+    def finish(self):
+        if self._file is not None:
+            self._file.write("\n]" if self.count else "]")
+        super().finish()
+
+class JsonlWriter(JsonWriter):
+    """流式写入json lines"""
+    def open(self):
+        self._file = open(self.part_path, mode="w", encoding="utf-8")
+
+    def write_record(self, record: dict):
+        item = {k: v for k, v in record.items() if k not in self.excludes}
+        self._file.write(json.dumps(item, ensure_ascii=False) + "\n")
+
+    def finish(self):
+        StreamWriter.finish(self)
+
+class CsvWriter(StreamWriter):
+    """流式写入csv"""
+    def open(self, encoding="utf-8-sig"):
+        self._file = open(self.part_path, mode="w", newline="", encoding=encoding)
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(self.document.field_map.values())
+
+    def write_record(self, record: dict):
+        self._writer.writerow(self.row(record))
+
+class XlsxWriter(StreamWriter):
+    """流式写入xlsx, 使用只写模式的工作簿, 内存占用不随行数增长"""
+    _workbook = None
+
+    def open(self):
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Alignment, Font
+        from openpyxl.utils import get_column_letter
+        self._workbook = Workbook(write_only=True)
+        self._sheet = self._workbook.create_sheet()
+        headers = []
+        for col_num, header in enumerate(self.document.field_map.values(), 1):
+            self._sheet.column_dimensions[get_column_letter(col_num)].width = len(header) * 2 + 5
+            cell = WriteOnlyCell(self._sheet, value=header)
+            cell.alignment = Alignment(horizontal='center')
+            cell.font = Font(bold=True)
+            headers.append(cell)
+        self._sheet.auto_filter.ref = self.document.field_ref
+        self._sheet.append(headers)
+
+    def write_record(self, record: dict):
+        self._sheet.append(self.row(record))
+
+    def finish(self):
+        if self._workbook is not None:
+            self._workbook.save(self.part_path)
+            self._workbook = None
+
+def import_pyarrow():
+    """按需导入pyarrow"""
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise RuntimeError(f"{Fore.RED}parquet/arrow格式需要安装pyarrow: pip install pyarrow{Fore.RESET}") from e
+    return pyarrow
+
+class ColumnarWriter(StreamWriter):
+    """按行组分批写入parquet或arrow, 列保留数值、日期、列表类型"""
+    batch_size = 10000
+    int_fields = {"comic_id", "total", "bonus_total", "rank", "last_rank", "fans", "ep_id", "comment_total", "bought_ep_count",
+                  "ord", "pay_mode", "pay_gold", "size", "image_count"}
+    date_fields = {"release_time", "date"}
+    list_fields = {"styles", "tags"}
+    bool_fields = {"allow_wait_free", "is_locked", "is_in_free"}
+    dictionary_fields = {"is_finish", "price", "info", "renewal_time"}
+    _writer = None
+
+    def open(self):
+        pa = import_pyarrow()
+        columns = []
+        for field in self.document.field_map:
+            if field in self.int_fields:
+                kind = pa.int64()
+            elif field in self.date_fields or field.endswith("_date"):
+                kind = pa.date32()
+            elif field in self.list_fields:
+                kind = pa.list_(pa.string())
+            elif field in self.bool_fields:
+                kind = pa.bool_()
+            elif field in self.dictionary_fields:
+                kind = pa.dictionary(pa.int32(), pa.string())
+            else:
+                kind = pa.string()
+            columns.append(pa.field(field, kind))
+        self._schema = pa.schema(columns)
+        self._columns = {field: [] for field in self.document.field_map}
+        self._dictionaries = {field: {} for field in self.document.field_map if field in self.dictionary_fields}
+        self._buffered = 0
+        if self.document.type == "parquet":
+            import pyarrow.parquet as pq
+            use_dictionary = [f"{f}.list.element" if f in self.list_fields else f
+                              for f in self.document.field_map if f in self.list_fields | self.dictionary_fields]
+            self._writer = pq.ParquetWriter(self.part_path, self._schema, use_dictionary=use_dictionary)
+        else:
+            self._file = pa.OSFile(self.part_path, "wb")
+            options = pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+            self._writer = pa.ipc.new_file(self._file, self._schema, options=options)
+
+    def value(self, field: str, record: dict):
+        """按列类型转换字段值, 无法转换时为空"""
+        value = record.get(field)
+        if field in self.int_fields:
+            try:
+                return int(value)
+            except (TypeError, ValueError):
+                return None
+        if field in self.date_fields or field.endswith("_date"):
+            try:
+                return date.fromisoformat(str(value)[:10])
+            except ValueError:
+                return None
+        if field in self.list_fields:
+            if isinstance(value, str):
+                return [item for item in value.split(",") if item]
+            return [item.get("name", "") if isinstance(item, dict) else str(item) for item in value or []]
+        if field in self.bool_fields:
+            return None if value in (None, "") else value in (True, 1, "1", "是", "True", "true")
+        value = self.document.mapping_field(field, record)
+        if field in self._dictionaries:
+            # 字典只追加不重排, arrow文件中后续批次以增量字典写出
+            return self._dictionaries[field].setdefault(value, len(self._dictionaries[field]))
+        return value
+
+    def write_record(self, record: dict):
+        for field, column in self._columns.items():
+            column.append(self.value(field, record))
+        self._buffered += 1
+        if self._buffered >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """写出一个行组"""
+        if not self._buffered:
+            return
+        pa = import_pyarrow()
+        arrays = []
+        for field in self._schema:
+            column = self._columns[field.name]
+            if field.name in self._dictionaries:
+                dictionary = pa.array(list(self._dictionaries[field.name]), pa.string())
+                arrays.append(pa.DictionaryArray.from_arrays(pa.array(column, pa.int32()), dictionary))
+            else:
+                arrays.append(pa.array(column, field.type))
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=self._schema))
+        for column in self._columns.values():
+            column.clear()
+        self._buffered = 0
+
+    def finish(self):
+        if self._writer is not None:
+            self.flush()
+            self._writer.close()
+            self._writer = None
+        super().finish()
+
+class SqliteWriter(StreamWriter):
+    """写入sqlite, 按comic_id分批更新插入, 重复爬取时原地更新已有的行, 新数据为空的字段保留旧值"""
+    batch_size = 500
+    update_fields = ("ep_id", "ep_title", "short_title", "comment_total", "date")
+
+    def __init__(self, document: Document, path: str):
+        super().__init__(document, path)
+        self.part_path = path
+        self._conn = None
+        self._comics = []
+        self._updates = []
+        self._bonus = []
+        self.skipped = 0
+
+    def open(self):
+        try:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.Error as e:
+            raise RuntimeError(f"数据保存失败, 无法打开sqlite文件！ {e}") from e
+        is_update = self.document.field_map is self.document.field_map_update
+        fields = [field for field in self.document.field_map if field != "comic_id"]
+        self.comic_fields = [field for field in fields if not (is_update and field in self.update_fields)]
+        self.episode_fields = [field for field in fields if is_update and field in self.update_fields]
+        with self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS comics (comic_id INTEGER PRIMARY KEY, updated_at TEXT)")
+            if self.episode_fields:
+                # 只有更新推荐页列表带有日期与章节字段, 详情数据不写入该表
+                self._conn.execute("CREATE TABLE IF NOT EXISTS updates (comic_id INTEGER NOT NULL, date TEXT NOT NULL, ep_id TEXT, "
+                                   "ep_title TEXT, short_title TEXT, comment_total TEXT, PRIMARY KEY (comic_id, date))")
+                self._conn.execute("CREATE INDEX IF NOT EXISTS idx_updates_date ON updates (date)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS bonus (comic_id INTEGER NOT NULL, bonus_id INTEGER NOT NULL, title TEXT, "
+                               "online_time TEXT, offline_time TEXT, PRIMARY KEY (comic_id, bonus_id))")
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(comics)")}
+            for field in self.comic_fields:
+                if field not in columns:
+                    self._conn.execute(f'ALTER TABLE comics ADD COLUMN "{field}" TEXT')
+                    columns.add(field)
+            for index, column in (("idx_comics_status", "is_finish"), ("idx_comics_date", "last_ep_date")):
+                if column in columns:
+                    self._conn.execute(f"CREATE INDEX IF NOT EXISTS {index} ON comics ({column})")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_bonus_offline ON bonus (offline_time)")
+        self._comic_sql = self.upsert_sql("comics", ["comic_id"], self.comic_fields + ["updated_at"], keep_old=True)
+        self._update_sql = self.upsert_sql("updates", ["comic_id", "date"], [f for f in self.episode_fields if f != "date"])
+        self._bonus_sql = self.upsert_sql("bonus", ["comic_id", "bonus_id"], ["title", "online_time", "offline_time"])
+
+    @staticmethod
+    def upsert_sql(table: str, keys: list, fields: list, keep_old=False) -> str:
+        """生成按主键更新插入的语句, keep_old时新值为空则保留旧值"""
+        columns = ", ".join(f'"{column}"' for column in keys + fields)
+        values = ", ".join("?" for _ in keys + fields)
+        if keep_old:
+            updates = [f'"{f}" = COALESCE(NULLIF(excluded."{f}", \'\'), {table}."{f}")' for f in fields]
+        else:
+            updates = [f'"{f}" = excluded."{f}"' for f in fields]
+        conflict = f"DO UPDATE SET {", ".join(updates)}" if updates else "DO NOTHING"
+        return f"INSERT INTO {table} ({columns}) VALUES ({values}) ON CONFLICT ({", ".join(keys)}) {conflict}"
+
+    def write_record(self, record: dict):
+        try:
+            comic_id = int(record.get("comic_id"))
+        except (TypeError, ValueError):
+            # comic_id为主键, 没有id的行无法写入
+            self.skipped += 1
+            return
+        values = dict(zip(self.document.field_map, self.row(record)))
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self._comics.append([comic_id] + [values[field] for field in self.comic_fields] + [now])
+        if self.episode_fields:
+            self._updates.append([comic_id, values["date"]] + [values[f] for f in self.episode_fields if f != "date"])
+        for entry in record.get("bonus") or []:
+            item = entry["item"]
+            self._bonus.append([comic_id, item["id"], item["title"], item["online_time"], item["offline_time"]])
+        if len(self._comics) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """在一个事务中批量写入缓冲的数据"""
+        try:
+            with self._conn:
+                self._conn.executemany(self._comic_sql, self._comics)
+                if self._updates:
+                    self._conn.executemany(self._update_sql, self._updates)
+                if self._bonus:
+                    self._conn.executemany(self._bonus_sql, self._bonus)
+        except sqlite3.Error as e:
+            raise RuntimeError(f"数据保存失败, sqlite写入错误！ {e}") from e
+        self._comics.clear()
+        self._updates.clear()
+        self._bonus.clear()
+
+    def finish(self):
+        if self._conn is not None:
+            self.flush()
+            self._conn.close()
+            self._conn = None
+        if self.skipped:
+            tqdm.write(f"{Fore.YELLOW}{self.skipped}行数据没有comic_id, 未写入sqlite{Fore.RESET}")
+            self.skipped = 0
+
+    def close(self):
+        """sqlite直接写入输出文件, 无需替换"""
+        start = time.monotonic()
+        self.finish()
+        self.record_export(time.monotonic() - start)
+
+class EpisodeSqliteWriter(SqliteWriter):
+    """写入sqlite的episodes表, 按(comic_id, ep_id)分批更新插入"""
+    batch_size = 5000
+
+    def open(self):
+        try:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.Error as e:
+            raise RuntimeError(f"数据保存失败, 无法打开sqlite文件！ {e}") from e
+        self.fields = [field for field in self.document.field_map if field not in ("comic_id", "ep_id")]
+        columns = ", ".join(f'"{field}" TEXT' for field in self.fields)
+        with self._conn:
+            self._conn.execute(f"CREATE TABLE IF NOT EXISTS episodes (comic_id INTEGER NOT NULL, ep_id INTEGER NOT NULL, {columns}, "
+                               "PRIMARY KEY (comic_id, ep_id))")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_episodes_pub_time ON episodes (pub_time)")
+        self._episode_sql = self.upsert_sql("episodes", ["comic_id", "ep_id"], self.fields)
+
+    def write_record(self, record: dict):
+        values = dict(zip(self.document.field_map, self.row(record)))
+        self._comics.append([int(record["comic_id"]), int(record["ep_id"])] + [values[field] for field in self.fields])
+        if len(self._comics) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        try:
+            with self._conn:
+                self._conn.executemany(self._episode_sql, self._comics)
+        except sqlite3.Error as e:
+            raise RuntimeError(f"数据保存失败, sqlite写入错误！ {e}") from e
+        self._comics.clear()
 
 def is_launched_by_explorer():
-    """判断是否是双击运行(父进程为 explorer)"""
+    """判断是否是双击运行(父进程为 explorer), 非Windows平台无需检查进程树"""
+    if sys.platform != "win32":
+        return False
+    import psutil
     try:
         parent = psutil.Process(os.getpid()).parent().parent()
         return parent and 'explorer' in parent.name().lower()
@@ -1016,6 +3128,7 @@ def get_res_path(relative_path):
 
 def run_gui():
     """GUI 模式"""
+    import tkinter as tk
     root = tk.Tk()
     root.title("哔哩哔哩漫画元数据请求器")
     root.iconbitmap(get_res_path("BiliBili_favicon.ico"))
@@ -1029,79 +3142,514 @@ def run_gui():
     label.pack(pady=20, padx=20)
     root.mainloop()
 
+class ShardQueue:
+    """基于sqlite的分片队列, 领取分片时写入租约并定期续约, 租约过期的分片可被其他进程或机器重新领取"""
+    max_attempts = 3
+
+    def __init__(self, path: str, lease=300):
+        self.path = path
+        self.lease = lease
+
+    def connect(self) -> sqlite3.Connection:
+        """每次操作使用独立的短连接, 以 BEGIN IMMEDIATE 串行化多个进程的领取"""
+        try:
+            conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            conn.execute("CREATE TABLE IF NOT EXISTS shards (shard INTEGER PRIMARY KEY, items TEXT NOT NULL, "
+                         "status TEXT NOT NULL DEFAULT 'pending', owner TEXT, lease_until REAL, attempts INTEGER NOT NULL DEFAULT 0, output TEXT)")
+        except sqlite3.Error as e:
+            raise RuntimeError(f"分片队列打开失败！ {e}") from e
+        return conn
+
+    def execute(self, sql: str, params=(), immediate=False) -> list:
+        """在一个事务中执行语句并返回结果"""
+        with closing(self.connect()) as conn:
+            try:
+                conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+                rows = conn.execute(sql, params).fetchall()
+                conn.execute("COMMIT")
+                return rows
+            except sqlite3.Error as e:
+                raise RuntimeError(f"分片队列读写失败！ {e}") from e
+
+    def create(self, shards: list) -> bool:
+        """队列为空时写入分片, 已有分片时加入现有队列"""
+        with closing(self.connect()) as conn:
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                if conn.execute("SELECT COUNT(*) FROM shards").fetchone()[0]:
+                    conn.execute("COMMIT")
+                    return False
+                conn.executemany("INSERT INTO shards (shard, items) VALUES (?, ?)",
+                                 [(index, json.dumps(items, ensure_ascii=False)) for index, items in enumerate(shards)])
+                conn.execute("COMMIT")
+                return True
+            except sqlite3.Error as e:
+                raise RuntimeError(f"分片队列写入失败！ {e}") from e
+
+    def claim(self, owner: str):
+        """领取一个待执行或租约已过期的分片, 返回(分片序号, 分片内容)"""
+        rows = self.execute(
+            "UPDATE shards SET status = 'leased', owner = ?, lease_until = ?, attempts = attempts + 1 WHERE shard = ("
+            "SELECT shard FROM shards WHERE (status = 'pending' OR (status = 'leased' AND lease_until < ?)) AND attempts < ? "
+            "ORDER BY shard LIMIT 1) RETURNING shard, items",
+            (owner, time.time() + self.lease, time.time(), self.max_attempts), immediate=True)
+        return (rows[0][0], json.loads(rows[0][1])) if rows else None
+
+    def renew(self, shard: int, owner: str) -> bool:
+        """续约, 租约已被其他进程接管时返回False"""
+        return bool(self.execute("UPDATE shards SET lease_until = ? WHERE shard = ? AND owner = ? AND status = 'leased' RETURNING shard",
+                                 (time.time() + self.lease, shard, owner), immediate=True))
+
+    def release(self, shard: int, owner: str, throttled=False):
+        """放弃分片, 交还给其他进程领取, 因限频交还时不计入重试次数"""
+        self.execute("UPDATE shards SET status = 'pending', owner = NULL, lease_until = NULL, attempts = attempts - ? "
+                     "WHERE shard = ? AND owner = ?", (int(throttled), shard, owner), immediate=True)
+
+    def complete(self, shard: int, owner: str, output: str):
+        """标记分片完成并记录输出文件"""
+        self.execute("UPDATE shards SET status = 'done', lease_until = NULL, output = ? WHERE shard = ? AND owner = ?",
+                     (output, shard, owner), immediate=True)
+
+    def status(self) -> dict:
+        """各状态的分片数量, 超过重试次数仍未完成的分片计为failed"""
+        rows = self.execute("SELECT CASE WHEN status != 'done' AND attempts >= ? AND (status = 'pending' OR lease_until < ?) "
+                            "THEN 'failed' ELSE status END, COUNT(*) FROM shards GROUP BY 1", (self.max_attempts, time.time()))
+        return dict(rows)
+
+    def outputs(self) -> list:
+        """已完成分片的输出文件"""
+        return [row[0] for row in self.execute("SELECT output FROM shards WHERE status = 'done' ORDER BY shard")]
+
+    @contextmanager
+    def hold(self, shard: int, owner: str):
+        """执行分片期间在后台定期续约"""
+        stopped = Event()
+
+        def heartbeat():
+            while not stopped.wait(self.lease / 3):
+                try:
+                    if not self.renew(shard, owner):
+                        tqdm.write(f"{Fore.YELLOW}分片{shard}的租约已被其他进程接管{Fore.RESET}")
+                        return
+                except RuntimeError as e:
+                    tqdm.write(f"{Fore.YELLOW}分片{shard}续约失败: {e}{Fore.RESET}")
+
+        thread = Thread(target=heartbeat, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stopped.set()
+
+class EpisodeBuffer(dict):
+    """常驻模式下暂存一次轮询中解析出的章节, 按(comic_id, ep_id)去重"""
+    def write(self, row: dict):
+        self[(str(row["comic_id"]), row["ep_id"])] = row
+
+class Watcher:
+    """常驻模式, 复用同一个Crawler定时轮询列表页, 与上一次轮询的内存快照对比, 只为有变化的漫画请求详情、特典并写出"""
+    sources = ("update", "ranking", "favorite")
+
+    def __init__(self, args: argparse.Namespace, cl: Crawler):
+        self.args = args
+        self.cl = cl
+        self.intervals = {source: interval or args.watch_interval for source, interval in (args.watch or {}).items()}
+        self.listings = {source: {} for source in self.intervals}
+        self.records = {source: {} for source in self.intervals}
+        self.documents = {}
+        for source in self.intervals:
+            output = args.output
+            if len(self.intervals) > 1:
+                stem, ext = os.path.splitext(args.output)
+                output = f"{stem}.{source}{ext}"
+            self.documents[source] = Document(argparse.Namespace(**{**vars(args), "type": source, "output": output}))
+        self.episode_document = EpisodeDocument(args)
+        self.episodes = {}
+
+    def listing(self, source: str) -> list:
+        """请求一次列表页"""
+        if source == "update":
+            return self.cl.get_update_page_all(date.today().isoformat(), date.today().isoformat())
+        if source == "ranking":
+            page = self.cl.get_ranking_page(self.args.rank)
+            comic_id_list = [i.get("comic_id") for i in page.get("rankListInfo")]
+            comics = self.cl.get_ranking_page(comic_id_list).get("rankListInfo", [])
+            for index, comic in enumerate(comics):
+                comic["rank"] = index + 1
+            return comics
+        return self.cl.get_favorite_all() or []
+
+    @staticmethod
+    def fingerprint(comic: dict) -> str:
+        """列表数据的指纹"""
+        return json.dumps(comic, ensure_ascii=False, sort_keys=True, default=str)
+
+    def poll(self, source: str):
+        """轮询一次, 只处理相比上次轮询有变化的漫画"""
+        self.cl.flight.clear()
+        self.cl.episode_writer = EpisodeBuffer() if self.args.episodes else None
+        comics = self.listing(source)
+        if self.args.is_risk:
+            tqdm.write(f"{Fore.YELLOW}[{self.cl.req_type.get(source)}]412请求频繁, 下次轮询时重试{Fore.RESET}")
+            return
+        listings, records = self.listings[source], self.records[source]
+        prints = {str(comic.get("comic_id")): self.fingerprint(comic) for comic in comics}
+        changed = [comic for comic in comics if listings.get(str(comic.get("comic_id"))) != prints[str(comic.get("comic_id"))]]
+        if self.args.detail:
+            # 详情模式下输出详情数据, 列表中仅排名等字段变化时无需重新请求
+            stale = {str(comic.get("comic_id")) for comic in changed
+                     if str(comic.get("comic_id")) not in records or self.cl.is_changed(comic, records[str(comic.get("comic_id"))])}
+            for comic in changed:
+                if str(comic.get("comic_id")) not in stale:
+                    listings[str(comic.get("comic_id"))] = prints[str(comic.get("comic_id"))]
+            changed = [comic for comic in changed if str(comic.get("comic_id")) in stale]
+        tqdm.write(f"{Fore.CYAN}[{self.cl.req_type.get(source)}]{datetime.now():%H:%M:%S} 共{len(comics)}本漫画, 其中{len(changed)}本有变化{Fore.RESET}")
+        if not changed:
+            return
+        updated = changed
+        if self.args.detail:
+            updated = self.cl.get_comics_details([comic.get("comic_id") for comic in changed])
+        if self.args.bonus:
+            self.cl.get_comic_bonus_all(updated)
+        if self.args.is_risk:
+            done = {str(comic.get("comic_id")) for comic in updated if not self.args.bonus or "bonus_total" in comic}
+            updated = [comic for comic in updated if str(comic.get("comic_id")) in done]
+        for comic in updated:
+            comic_id = str(comic.get("comic_id"))
+            records[comic_id] = comic
+            listings[comic_id] = prints[comic_id]
+        current = {str(comic.get("comic_id")) for comic in comics}
+        for comic_id in list(records):
+            if comic_id not in current and source != "update":
+                records.pop(comic_id)
+                listings.pop(comic_id, None)
+        self.write(source, updated)
+        if self.cl.episode_writer:
+            self.write_episodes(self.cl.episode_writer)
+
+    def write(self, source: str, updated: list):
+        """sqlite只更新插入有变化的漫画, 其余格式按当前快照重写整个文件"""
+        dm = self.documents[source]
+        rows = updated if dm.output.lower().endswith(Document.sqlite_exts) else self.records[source].values()
+        with self.args.profiler.span(f"watch:{source}"), dm.writer() as writer:
+            for row in rows:
+                writer.write(row)
+        tqdm.write(f"{Fore.GREEN}[{self.cl.req_type.get(source)}]更新{len(updated)}本漫画, 已保存到{dm.output}{Fore.RESET}")
+
+    def write_episodes(self, buffer: EpisodeBuffer):
+        """每次轮询提交一次章节文件, sqlite只更新插入本次解析的章节, 其余格式按各来源当前快照中的漫画重写"""
+        dm = self.episode_document
+        rows = buffer.values()
+        if not dm.output.lower().endswith(Document.sqlite_exts):
+            # 重新请求详情的漫画整体替换其章节, 已不在任何快照中的漫画不再输出
+            for comic_id in {key[0] for key in buffer}:
+                self.episodes[comic_id] = {}
+            for (comic_id, ep_id), row in buffer.items():
+                self.episodes[comic_id][ep_id] = row
+            current = set().union(*(records.keys() for records in self.records.values()))
+            for comic_id in self.episodes.keys() - current:
+                self.episodes.pop(comic_id)
+            rows = [row for episodes in self.episodes.values() for row in episodes.values()]
+        with dm.writer() as writer:
+            for row in rows:
+                writer.write(row)
+        tqdm.write(f"{Fore.GREEN}章节更新{len(buffer)}个, 已保存到{dm.output}{Fore.RESET}")
+
+    def run(self):
+        """按各来源的间隔循环轮询, 直到手动中断"""
+        if "favorite" in self.intervals and not self.args.headers:
+            print(f"{Fore.RED}轮询我的追漫需要使用参数--headers导入正确填写Cookie的json文件{Fore.RESET}")
+            return
+        self.cl.get_parameter()
+        if not self.cl.confirm():
+            return
+        due = dict.fromkeys(self.intervals, 0.0)
+        try:
+            while True:
+                for source, interval in self.intervals.items():
+                    if due[source] > time.monotonic():
+                        continue
+                    self.args.is_risk = False
+                    try:
+                        self.poll(source)
+                    except RuntimeError as e:
+                        tqdm.write(f"{Fore.RED}[{self.cl.req_type.get(source)}]轮询失败, 下次轮询时重试: {e}{Fore.RESET}")
+                    self.cl.journal.remove()
+                    due[source] = time.monotonic() + interval
+                time.sleep(max(min(due.values()) - time.monotonic(), 0))
+        except KeyboardInterrupt:
+            tqdm.write(f"{Fore.YELLOW}常驻模式已停止{Fore.RESET}")
+
+def shard_path(path: str, shard: int) -> str:
+    """分片输出文件名"""
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.shard{shard:04d}{ext}"
+
+def split_input(args: argparse.Namespace, dm: Document) -> list:
+    """将-I输入文件的行按comic_id的crc32哈希拆分为各分片的jsonl输入文件, 保留全部列, 返回各分片的输入文件路径"""
+    stem = os.path.splitext(args.output)[0]
+    paths = [shard_path(f"{stem}.input.jsonl", shard) for shard in range(args.shards)]
+    counts = [0] * args.shards
+    files = []
+    try:
+        for path in paths:
+            files.append(open(f"{path}.part", "w", encoding="utf-8"))
+        for comic in dm.iter_load():
+            shard = zlib.crc32(str(comic.get("comic_id")).encode()) % args.shards
+            files[shard].write(json.dumps(comic, ensure_ascii=False, default=str) + "\n")
+            counts[shard] += 1
+    except (OSError, ValueError) as e:
+        raise RuntimeError(f"分片输入文件写入失败！ {e}") from e
+    finally:
+        for f in files:
+            f.close()
+    result = []
+    for path, rows in zip(paths, counts):
+        if rows:
+            os.replace(f"{path}.part", path)
+            result.append([path])
+        else:
+            os.remove(f"{path}.part")
+    return result
+
+def split_shards(args: argparse.Namespace, dm: Document) -> list:
+    """漫画ID按crc32哈希分片, -I输入按行拆分为各分片的输入文件, 更新推荐页的日期按连续区间分片"""
+    if args.input:
+        return split_input(args, dm)
+    if args.id:
+        shards = [[] for _ in range(args.shards)]
+        for comic_id in args.id:
+            shards[zlib.crc32(str(comic_id).encode()) % args.shards].append(comic_id)
+        return [shard for shard in shards if shard]
+    start = datetime.strptime(args.sdate, "%Y-%m-%d")
+    dates = [(start + timedelta(days=i)).strftime("%Y-%m-%d") for i in range((datetime.strptime(args.edate, "%Y-%m-%d") - start).days + 1)]
+    size = -(-len(dates) // args.shards)
+    return [dates[i:i + size] for i in range(0, len(dates), size)]
+
+def run_sharded(args: argparse.Namespace, cl: Crawler, dm: Document):
+    """写入分片队列并启动本机工作进程, 其他机器使用相同命令与同一队列文件即可加入"""
+    if not (args.id or args.input or args.type == "update"):
+        print(f"{Fore.RED}分片模式仅支持 -i、-I 或 -t update{Fore.RESET}")
+        return
+    queue = ShardQueue(args.queue or f"{args.output}.queue", args.lease)
+    # 加入已有队列时无需再次拆分输入
+    if not queue.status() and queue.create(shards := split_shards(args, dm)):
+        tqdm.write(f"{Fore.CYAN}已创建{len(shards)}个分片, 队列文件为{queue.path}{Fore.RESET}")
+    else:
+        tqdm.write(f"{Fore.CYAN}加入已有的分片队列{queue.path}: {queue.status()}{Fore.RESET}")
+    if not cl.confirm():
+        return
+    if args.processes > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(args.processes) as pool:
+            futures = [pool.submit(run_shard_worker, args.argv, worker) for worker in range(args.processes)]
+            finished = sum(future.result() for future in futures)
+    else:
+        finished = run_shard_worker(args.argv, 0)
+    status = queue.status()
+    tqdm.write(f"{Fore.GREEN}本机完成{finished}个分片, 队列状态: {status}{Fore.RESET}")
+    if set(status) == {"done"}:
+        tqdm.write(f"{Fore.GREEN}全部分片已完成, 添加参数--merge合并输出{Fore.RESET}")
+
+def run_shard_worker(argv: list, worker: int) -> int:
+    """工作进程: 循环领取分片并按普通流程执行, 返回完成的分片数"""
+    base = parse_args(argv)
+    queue = ShardQueue(base.queue or f"{base.output}.queue", base.lease)
+    owner = f"{socket.gethostname()}:{os.getpid()}:{worker}"
+    finished = 0
+    while claimed := queue.claim(owner):
+        shard, items = claimed
+        args = parse_args(argv)
+        args.yes, args.shards, args.resume = True, 0, True
+        args.output = shard_path(base.output, shard)
+        if args.episodes:
+            args.episodes = shard_path(base.episodes, shard)
+        if args.input:
+            # 分片使用各自的输入文件, 与普通的 -I 流程一致
+            args.input = items[0]
+        elif args.id:
+            args.id = items
+        else:
+            args.sdate, args.edate = items[0], items[-1]
+        cl = Crawler(args)
+        try:
+            with queue.hold(shard, owner):
+                run_cli(args, cl, Document(args))
+        except Exception:
+            tqdm.write(f"{Fore.RED}分片{shard}执行出现错误, 交还队列 {traceback.format_exc()}{Fore.RESET}")
+            queue.release(shard, owner)
+            continue
+        finally:
+            cl.close()
+        if args.is_risk:
+            queue.release(shard, owner, throttled=True)
+            tqdm.write(f"{Fore.YELLOW}分片{shard}触发限频, 已交还队列, 工作进程{owner}退出{Fore.RESET}")
+            break
+        queue.complete(shard, owner, args.output)
+        finished += 1
+    return finished
+
+def merge_shards(args: argparse.Namespace, dm: Document):
+    """按comic_id合并已完成分片的输出, 更新推荐页按(comic_id, 日期)去重"""
+    queue = ShardQueue(args.queue or f"{args.output}.queue", args.lease)
+    outputs = queue.outputs()
+    status = queue.status()
+    if set(status) - {"done"}:
+        tqdm.write(f"{Fore.YELLOW}仍有分片未完成, 仅合并已完成的分片: {status}{Fore.RESET}")
+    seen = set()
+    with dm.writer() as writer:
+        for path in outputs:
+            for comic in dm.iter_load(path):
+                key = (str(comic.get("comic_id")), comic.get("date"))
+                if key in seen:
+                    continue
+                seen.add(key)
+                writer.write(comic)
+    tqdm.write(f"{Fore.GREEN}已合并{len(outputs)}个分片, 共{writer.count}条数据, 保存为{args.output}{Fore.RESET}")
+
 def run_cli(args: argparse.Namespace, cl: Crawler, dm: Document):
-    """CLI 模式"""
+    """CLI 模式, 指定--episodes时在整个运行期间打开章节写入器, 常驻模式除外"""
+    if args.merge:
+        merge_shards(args, dm)
+        return
+    if args.shards:
+        run_sharded(args, cl, dm)
+        return
+    if args.watch:
+        # 常驻模式每次轮询单独提交章节文件
+        Watcher(args, cl).run()
+        return
+    with EpisodeDocument(args).writer(bool(args.episodes)) as cl.episode_writer:
+        cl.replay_episodes()
+        run_stages(args, cl, dm)
+    if cl.episode_writer:
+        tqdm.write(f"{Fore.GREEN}章节数据保存成功, 共{cl.episode_writer.count}个章节{Fore.RESET}")
+    cl.episode_writer = None
+
+def run_stages(args: argparse.Namespace, cl: Crawler, dm: Document):
+    """CLI 模式各阶段"""
     comics: list = []
-    cl.get_parameter()
+    snapshot = dm.load_snapshot() if args.incremental and args.detail else []
+    with args.profiler.span("parameter"):
+        cl.get_parameter()
     if args.parameter:
         print(cl.parse_parameter())
-    if args.input:
-        comics = dm.load()
+    listing_only = not args.detail and not args.bonus
+    if args.input and args.stream:
+        if cl.confirm():
+            with args.profiler.span("stream"), dm.writer() as writer:
+                records = dm.iter_load(skip=lambda comic: not any(cl.stream_stages(comic)), on_skip=writer.write)
+                cl.enrich_stream(records, writer.write)
+            tqdm.write(f"{Fore.GREEN}流式补全数据保存成功, 共{writer.count}本漫画{Fore.RESET}")
+            report_run(args, cl)
+        return
+    elif args.input:
+        with args.profiler.span("load"):
+            comics = dm.load()
         args.id = [comic['comic_id'] for comic in comics]
         if cl.confirm():
             if args.detail or not args.bonus:
-                comics = cl.get_comics_details(comics=comics)
-                dm.save(comics)
-                tqdm.write(f"{Fore.GREEN}自定义漫画ID数据保存成功, 共{len(comics)}本漫画{Fore.RESET}")
+                with args.profiler.span("detail"), dm.writer(not args.bonus) as writer:
+                    comics = cl.get_comics_details(comics=comics, on_record=writer and writer.write)
+                if writer:
+                    tqdm.write(f"{Fore.GREEN}自定义漫画ID数据保存成功, 共{len(comics)}本漫画{Fore.RESET}")
     elif args.id:
         if cl.confirm():
-            comics = cl.get_comics_details(args.id)
-            dm.save(comics)
-            tqdm.write(f"{Fore.GREEN}自定义漫画ID数据保存成功, 共{len(comics)}本漫画{Fore.RESET}")
+            with args.profiler.span("detail"), dm.writer(not args.bonus) as writer:
+                comics = cl.get_comics_details(args.id, on_record=writer and writer.write)
+            if writer:
+                tqdm.write(f"{Fore.GREEN}自定义漫画ID数据保存成功, 共{len(comics)}本漫画{Fore.RESET}")
     elif args.type == 'classify':
         if cl.confirm():
-            comics = cl.get_classify_page_all()
-            dm.save(comics)
-            tqdm.write(f"{Fore.GREEN}[分类页]数据保存成功, 共{len(comics)}本漫画{Fore.RESET}")
+            with args.profiler.span("listing"):
+                comics = cl.get_classify_page_all()
+            if listing_only:
+                dm.save(comics)
+                tqdm.write(f"{Fore.GREEN}[分类页]数据保存成功, 共{len(comics)}本漫画{Fore.RESET}")
     elif args.type == 'ranking':
         if cl.confirm():
-            page = cl.get_ranking_page(args.rank)
-            comic_id_list = [i.get("comic_id") for i in page.get("rankListInfo")]
-            comics = cl.get_ranking_page(comic_id_list).get("rankListInfo", [])
+            with args.profiler.span("listing"):
+                page = cl.get_ranking_page(args.rank)
+                comic_id_list = [i.get("comic_id") for i in page.get("rankListInfo")]
+                comics = cl.get_ranking_page(comic_id_list).get("rankListInfo", [])
             for index, comic in enumerate(comics):
                 comic["rank"] = index + 1
-            dm.save(comics)
-            tqdm.write(f"{Fore.GREEN}[{cl.ranking_dict[args.rank]}]数据保存成功, 共{len(comics)}本漫画{Fore.RESET}")
+            if listing_only:
+                dm.save(comics)
+                tqdm.write(f"{Fore.GREEN}[{cl.ranking_dict[args.rank]}]数据保存成功, 共{len(comics)}本漫画{Fore.RESET}")
     elif args.type == 'update':
         if cl.confirm():
-            comics = cl.get_update_page_all()
-            dm.save(comics)
-            tqdm.write(f"{Fore.GREEN}[更新推荐页]数据保存成功, 共{len(comics)}本漫画{Fore.RESET}")
+            with args.profiler.span("listing"):
+                comics = cl.get_update_page_all()
+            if listing_only:
+                dm.save(comics)
+                tqdm.write(f"{Fore.GREEN}[更新推荐页]数据保存成功, 共{len(comics)}本漫画{Fore.RESET}")
     elif args.type == 'home_feed':
         if cl.confirm():
-            comics = cl.get_home_feeds_all()
-            dm.save(comics)
-            tqdm.write(f"{Fore.GREEN}[主页信息流]数据保存成功, 共{len(comics)}本漫画{Fore.RESET}")
+            with args.profiler.span("listing"):
+                comics = cl.get_home_feeds_all()
+            if listing_only:
+                dm.save(comics)
+                tqdm.write(f"{Fore.GREEN}[主页信息流]数据保存成功, 共{len(comics)}本漫画{Fore.RESET}")
     elif args.type == 'favorite':
         if not args.headers:
             print(f"{Fore.RED}请使用参数--headers导入正确填写Cookie的json文件{Fore.RESET}")
             return
         if cl.confirm():
-            comics = cl.get_favorite_all()
-            dm.save(comics)
-            tqdm.write(f"{Fore.GREEN}[我的追漫]数据保存成功, 共{len(comics)}本漫画{Fore.RESET}")
+            with args.profiler.span("listing"):
+                comics = cl.get_favorite_all()
+            if listing_only:
+                dm.save(comics)
+                tqdm.write(f"{Fore.GREEN}[我的追漫]数据保存成功, 共{len(comics)}本漫画{Fore.RESET}")
     elif args.type == 'buy':
         if cl.confirm():
-            comics = cl.get_buy_comics()
-            dm.save(comics)
-            tqdm.write(f"{Fore.GREEN}[已购漫画]数据保存成功, 共{len(comics)}本漫画{Fore.RESET}")
+            with args.profiler.span("listing"):
+                comics = cl.get_buy_comics()
+            if listing_only:
+                dm.save(comics)
+                tqdm.write(f"{Fore.GREEN}[已购漫画]数据保存成功, 共{len(comics)}本漫画{Fore.RESET}")
 
     if  len(comics) == 0:
         return
 
     if not args.id and args.detail:
         args.id = [comic['comic_id'] for comic in comics]
-        comics = cl.get_comics_details(args.id)
-        dm.save(comics)
-        tqdm.write(f"{Fore.GREEN}漫画详情页保存成功, 共{len(comics)}本漫画{Fore.RESET}")
+        with args.profiler.span("detail"), dm.writer(not args.bonus) as writer:
+            if args.incremental:
+                comics = cl.get_comics_details_incremental(comics, snapshot, on_record=writer and writer.write)
+            else:
+                comics = cl.get_comics_details(args.id, on_record=writer and writer.write)
+        if writer:
+            tqdm.write(f"{Fore.GREEN}漫画详情页保存成功, 共{len(comics)}本漫画{Fore.RESET}")
 
     if args.bonus:
-        if cl.get_comic_bonus_all(comics):
-            dm.save(comics)
-            tqdm.write(f"{Fore.GREEN}特典数据保存成功{Fore.RESET}")
+        with args.profiler.span("bonus"), dm.writer() as writer:
+            cl.get_comic_bonus_all(comics, on_record=writer.write)
+        tqdm.write(f"{Fore.GREEN}特典数据保存成功{Fore.RESET}")
+
+    report_run(args, cl)
 
+def report_run(args: argparse.Namespace, cl: Crawler):
+    """输出限频提示与请求统计"""
     if args.is_risk:
         print(f"{Fore.YELLOW}412请求频繁, IP已触发限频, 请稍后再尝试请求...{Fore.RESET}")
+        print(f"{Fore.YELLOW}已完成的请求记录在{cl.journal.path}, 稍后可添加参数--resume继续{Fore.RESET}")
+    else:
+        cl.journal.remove()
+
+    if args.bonus_expiring is not None and args.bonus:
+        expiring = cl.bonus_index.expiring(args.bonus_expiring)
+        tqdm.write(f"{Fore.CYAN}未来{args.bonus_expiring:g}天内下架的特典共{len(expiring)}个{":" if expiring else ""}{Fore.RESET}")
+        for item in expiring:
+            tqdm.write(f"  {item['offline_time']}  {item['comic_title']}({item['comic_id']})  {item['title']}")
+
+    if args.cache:
+        tqdm.write(f"{Fore.CYAN}{cl.cache.stats()}{Fore.RESET}")
+    if cl.flight.shared:
+        tqdm.write(f"{Fore.CYAN}请求合并: {cl.flight.shared}次重复请求复用了同一漫画的结果{Fore.RESET}")
+    requests_count, connections_count = cl.connection_stats()
+    if requests_count:
+        tqdm.write(f"{Fore.CYAN}连接复用统计: 共请求{requests_count}次, 新建连接{connections_count}个, 复用连接{requests_count - connections_count}次{Fore.RESET}")
 
 if __name__ == "__main__":
     if is_launched_by_explorer():
@@ -1116,3 +3664,5 @@ if __name__ == "__main__":
             pass
         except Exception:
             print(f"{Fore.RED}程序执行出现错误, 意外退出\n{traceback.print_exc()}{Fore.RESET}")
+        finally:
+            crawler.close()